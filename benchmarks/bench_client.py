@@ -0,0 +1,323 @@
+#coding: utf-8
+
+"""
+Benchmark of the clients against the local mock intranet.
+
+Starts :mod:`mock_server` in a child process, then drives every method of
+:class:`etnapy.Intra` sequentially and from a pool of threads, and of
+:class:`etnapy.AsyncIntra` if aiohttp is installed. Reports the operations
+per second, the p50/p99 latencies and the peak memory of each scenario.
+No network access is needed, so runs on different versions of the library
+can be compared with ``--save`` and ``--compare``.
+
+Usage: python benchmarks/bench_client.py [--ops 500] [--concurrency 16] ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import etnapy
+from etnapy import Intra
+
+try:
+    from etnapy import AsyncIntra
+    import aiohttp  # noqa: F401
+except ImportError:
+    AsyncIntra = None
+
+import mock_server
+from mock_server import base_urls, login_of
+
+
+BULK_SIZE = 50
+
+
+def _read(f):
+    if f is None:
+        return False
+    try:
+        return len(f.read()) > 0
+    finally:
+        f.close()
+
+
+def _all_ok(results):
+    return all(r is not None and not isinstance(r, Exception) for r in results.values())
+
+
+def sync_scenarios(client, urls, args):
+    logins = [login_of(i) for i in range(args.users)]
+    walls = ['Wall %d' % (i,) for i in range(args.walls)]
+
+    def login_logout(i):
+        intra = Intra(base_urls=urls, json_backend=args.json_backend)
+        try:
+            return intra.login(logins[i % len(logins)], 'password') is not None
+        finally:
+            intra.logout()
+
+    return [
+        ('login_logout', login_logout),
+        ('user_info', lambda i: client.user_info(logins[i % len(logins)]) is not None),
+        ('user_avatar', lambda i: _read(client.user_avatar(logins[i % len(logins)]))),
+        ('user_promo', lambda i: client.user_promo(logins[i % len(logins)]) is not None),
+        ('user_trophy', lambda i: client.user_trophy(logins[i % len(logins)]) is not None),
+        ('iter_user_trophy', lambda i: sum(1 for _ in client.iter_user_trophy(logins[i % len(logins)])) > 0),
+        ('trophy_picture', lambda i: _read(client.trophy_picture(i % 300)[1])),
+        ('walls_list', lambda i: client.walls_list() is not None),
+        ('wall_messages', lambda i: client.wall_messages(walls[i % len(walls)], 0, 20) is not None),
+        ('iter_wall', lambda i: sum(1 for _ in client.iter_wall(walls[i % len(walls)], 50)) > 0),
+        ('users_info', lambda i: _all_ok(client.users_info(
+            [logins[(i * BULK_SIZE + j) % len(logins)] for j in range(BULK_SIZE)]))),
+    ]
+
+
+def async_scenarios(client, urls, args):
+    logins = [login_of(i) for i in range(args.users)]
+    walls = ['Wall %d' % (i,) for i in range(args.walls)]
+
+    async def login_logout(i):
+        async with AsyncIntra(base_urls=urls, json_backend=args.json_backend) as intra:
+            try:
+                return await intra.login(logins[i % len(logins)], 'password') is not None
+            finally:
+                await intra.logout()
+
+    async def user_info(i):
+        return await client.user_info(logins[i % len(logins)]) is not None
+
+    async def user_avatar(i):
+        return bool(await client.user_avatar(logins[i % len(logins)]))
+
+    async def user_promo(i):
+        return await client.user_promo(logins[i % len(logins)]) is not None
+
+    async def user_trophy(i):
+        return await client.user_trophy(logins[i % len(logins)]) is not None
+
+    async def trophy_picture(i):
+        return bool((await client.trophy_picture(i % 300))[1])
+
+    async def walls_list(i):
+        return await client.walls_list() is not None
+
+    async def wall_messages(i):
+        return await client.wall_messages(walls[i % len(walls)], 0, 20) is not None
+
+    async def iter_wall(i):
+        count = 0
+        async for _ in client.iter_wall(walls[i % len(walls)], 50):
+            count += 1
+        return count > 0
+
+    async def users_info(i):
+        return _all_ok(await client.users_info(
+            [logins[(i * BULK_SIZE + j) % len(logins)] for j in range(BULK_SIZE)]))
+
+    return [
+        ('login_logout', login_logout),
+        ('user_info', user_info),
+        ('user_avatar', user_avatar),
+        ('user_promo', user_promo),
+        ('user_trophy', user_trophy),
+        ('trophy_picture', trophy_picture),
+        ('walls_list', walls_list),
+        ('wall_messages', wall_messages),
+        ('iter_wall', iter_wall),
+        ('users_info', users_info),
+    ]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(results, elapsed):
+    latencies = [latency for latency, _ in results]
+    return {
+        'ops': len(results),
+        'errors': sum(1 for _, ok in results if not ok),
+        'ops_per_sec': len(results) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_sync(func, count, concurrency):
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = func(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(i) for i in range(count)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(one, range(count)))
+    return summarize(results, time.perf_counter() - start)
+
+
+async def run_async(func, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await func(i)
+            except Exception:
+                ok = False
+            return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(count)])
+    return summarize(results, time.perf_counter() - start)
+
+
+def peak_memory(run):
+    """Returns the peak of the memory allocated by ``run()``, in KiB."""
+
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(name, mode, run, args):
+    """Warms ``run(count)`` up, times it, then measures its peak memory on a
+    second, shorter run (tracemalloc slows the code it traces).
+    """
+
+    ops = max(1, args.ops // BULK_SIZE) if name == 'users_info' else args.ops
+    if args.warmup:
+        run(min(args.warmup, ops))
+    stats = run(ops)
+    stats['peak_kib'] = peak_memory(lambda: run(min(ops, args.memory_ops))) if args.memory_ops else 0.0
+    stats.update(scenario=name, mode=mode)
+    print('%-17s %-10s %6d %6d %10.1f %9.2f %9.2f %10.1f' % (
+        name, mode, stats['ops'], stats['errors'], stats['ops_per_sec'],
+        stats['p50_ms'], stats['p99_ms'], stats['peak_kib']))
+    return stats
+
+
+def login(client, retries=10):
+    for _ in range(retries):
+        if client.login(login_of(0), 'password') is not None:
+            return
+    raise RuntimeError('could not log in to the mock server')
+
+
+def bench_sync(urls, args):
+    client = Intra(base_urls=urls, pool_maxsize=max(10, args.concurrency), json_backend=args.json_backend)
+    login(client)
+    rows = []
+    for name, func in sync_scenarios(client, urls, args):
+        if not selected(name, args):
+            continue
+        for mode, concurrency in (('sequential', 1), ('threads', args.concurrency)):
+            rows.append(measure(name, mode, lambda count: run_sync(func, count, concurrency), args))
+    client.logout()
+    return rows
+
+
+def bench_async(urls, args):
+    loop = asyncio.new_event_loop()
+    client = AsyncIntra(base_urls=urls, json_backend=args.json_backend)
+    rows = []
+    try:
+        for _ in range(10):
+            if loop.run_until_complete(client.login(login_of(0), 'password')) is not None:
+                break
+        for name, func in async_scenarios(client, urls, args):
+            if not selected(name, args):
+                continue
+            rows.append(measure(name, 'async', lambda count: loop.run_until_complete(
+                run_async(func, count, args.concurrency)), args))
+        loop.run_until_complete(client.logout())
+    finally:
+        loop.run_until_complete(client.close())
+        loop.close()
+    return rows
+
+
+def selected(name, args):
+    return not args.scenarios or name in args.scenarios
+
+
+def compare(rows, path):
+    with open(path) as f:
+        baseline = {(r['scenario'], r['mode']): r for r in json.load(f)['results']}
+    print()
+    print('Compared with %s' % (path,))
+    for row in rows:
+        old = baseline.get((row['scenario'], row['mode']))
+        if old is None or not old['ops_per_sec']:
+            continue
+        change = (row['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+        print('%-17s %-10s %10.1f -> %10.1f ops/s  %+6.1f%%   p99 %8.2f -> %8.2f ms' % (
+            row['scenario'], row['mode'], old['ops_per_sec'], row['ops_per_sec'], change,
+            old['p99_ms'], row['p99_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=500, help='operations per scenario')
+    parser.add_argument('--concurrency', type=int, default=16, help='threads or coroutines in flight')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed operations before each scenario')
+    parser.add_argument('--memory-ops', type=int, default=100,
+                        help='operations of the run measuring the peak memory, 0 to skip it')
+    parser.add_argument('--scenarios', nargs='*', help='only run these scenarios')
+    parser.add_argument('--json-backend', default='json', help='json, orjson, ujson or auto')
+    parser.add_argument('--no-async', action='store_true', help='skip the AsyncIntra scenarios')
+    parser.add_argument('--save', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results saved by --save')
+    mock_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    dataset, options = mock_server.options_from(args)
+    process, root = mock_server.start_process(dataset_options=dataset, **options)
+    urls = base_urls(root)
+
+    print('etnapy %s, Python %s, mock server at %s' % (etnapy.__version__, platform.python_version(), root))
+    print('%-17s %-10s %6s %6s %10s %9s %9s %10s' % (
+        'scenario', 'mode', 'ops', 'errors', 'ops/s', 'p50 ms', 'p99 ms', 'peak KiB'))
+    try:
+        rows = bench_sync(urls, args)
+        if AsyncIntra is not None and not args.no_async:
+            rows += bench_async(urls, args)
+    finally:
+        process.terminate()
+        process.join()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'version': etnapy.__version__,
+                'python': platform.python_version(),
+                'options': vars(args),
+                'results': rows,
+            }, f, indent=2)
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#coding: utf-8
+
+"""
+Benchmark of the start-up time of the package and of its command line.
+
+Times, in fresh interpreters, ``import etnapy``, ``python -m etnapy
+--help`` and a query of the command line answered by a SQLite cache, and
+checks that none of them imports the HTTP clients. The bare interpreter
+start-up is measured as well and subtracted. With ``--max-ms``, exits with
+status 1 if a case costs more than that on top of the interpreter, so a
+regression of the lazy imports can fail a CI job.
+
+Usage: python benchmarks/bench_import.py [--runs 20] [--max-ms 50]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+#: Modules which must not be imported before a request is sent.
+HEAVY = ('requests', 'urllib3', 'aiohttp', 'numpy', 'orjson', 'pyarrow')
+
+
+def fill_cache(path, logins):
+    from etnapy import SQLiteCache
+
+    cache = SQLiteCache(path)
+    for login in logins:
+        data = {'id': 1, 'login': login, 'firstname': 'First', 'lastname': 'Last',
+                'email': '%s@etna-alternance.net' % (login,), 'close': False, 'roles': ['student'],
+                'created_at': '2018-09-01 10:00:00', 'updated_at': '2019-02-12 18:04:12',
+                'deleted_at': None}
+        cache.put('https://auth.etna-alternance.net/api/users/%s' % (login,), data, 3600,
+                  login=login, endpoint='user_info')
+    cache.close()
+
+
+def run(argv):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + argv, cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def imported(argv):
+    """Returns the names of the modules imported by ``argv``."""
+
+    res = subprocess.run([sys.executable, '-X', 'importtime'] + argv, cwd=ROOT, check=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    return {line.rsplit('|', 1)[1].strip() for line in res.stderr.splitlines()
+            if line.startswith('import time:') and '|' in line}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='runs of each case')
+    parser.add_argument('--logins', type=int, default=20, help='logins of the cached query')
+    parser.add_argument('--max-ms', type=float, help='fail if a case costs more than this over the interpreter')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'cache.db')
+        logins = ['user_%04d' % (i,) for i in range(args.logins)]
+        fill_cache(db, logins)
+
+        cases = [
+            ('python', ['-c', 'pass'], False),
+            ('import etnapy', ['-c', 'import etnapy'], True),
+            ('-m etnapy --help', ['-m', 'etnapy', '--help'], True),
+            ('cached query', ['-m', 'etnapy', '--cache', db, 'user'] + logins, True),
+            ('import Intra', ['-c', 'from etnapy import Intra'], False),
+        ]
+
+        print('Python %s, %d runs' % (sys.version.split()[0], args.runs))
+        print('%-18s %9s %9s %9s  %s' % ('case', 'min ms', 'median ms', 'extra ms', 'heavy imports'))
+        failed = False
+        baseline = None
+        for name, argv, lazy in cases:
+            run(argv)
+            times = [run(argv) for _ in range(args.runs)]
+            median = statistics.median(times)
+            if baseline is None:
+                baseline = median
+            extra = median - baseline
+            heavy = sorted(m for m in imported(argv) if m.split('.')[0] in HEAVY and '.' not in m)
+            print('%-18s %9.1f %9.1f %9.1f  %s' % (name, min(times), median, extra, ', '.join(heavy) or '-'))
+            if lazy and (heavy or (args.max_ms is not None and extra > args.max_ms)):
+                failed = True
+
+    if failed:
+        print('\nA lazy case imports a heavy module or exceeds the budget.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#coding: utf-8
+
+"""
+Micro-benchmark of the construction of the models.
+
+Compares the slotted, lazily parsed :class:`etnapy.Trophy` and
+:class:`etnapy.User` with the former eager ``strptime`` implementation.
+
+Usage: python benchmarks/bench_models.py [count]
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from etnapy import User, Trophy
+
+
+class EagerTrophy():
+    def __init__(self, json_data):
+        self.id = json_data["id"]
+        self.name = json_data["name"]
+        self.description = json_data["description"]
+        self.type = json_data["type"]
+        self.image_url = 'https://achievements.etna-alternance.net/api/achievements/%d.png' % (self.id)
+        self.achieved_at = datetime.strptime(json_data["achieved_at"][0], '%Y-%m-%d %H:%M:%S')
+
+
+class EagerUser():
+    def __init__(self, json_data):
+        self.id = json_data["id"]
+        self.login = json_data["login"]
+        self.firstname = json_data["firstname"]
+        self.lastname = json_data["lastname"]
+        self.email = json_data["email"]
+        if isinstance(json_data["close"], (bool)):
+            self.close = False
+        else:
+            self.close = True
+            self.closed_at = datetime.strptime(json_data["close"], '%Y-%m-%d %H:%M:%S')
+        self.roles = json_data["roles"]
+        if json_data["created_at"] is not None:
+            self.created_at = datetime.strptime(json_data["created_at"], '%Y-%m-%d %H:%M:%S')
+        if json_data["updated_at"] is not None:
+            self.updated_at = datetime.strptime(json_data["updated_at"], '%Y-%m-%d %H:%M:%S')
+        if json_data["deleted_at"] is not None:
+            self.deleted_at = datetime.strptime(json_data["deleted_at"], '%Y-%m-%d %H:%M:%S')
+
+
+def trophies(count):
+    return [{
+        'id': i % 300,
+        'name': 'Trophy %d' % (i % 300,),
+        'description': 'A trophy',
+        'type': ('bronze', 'silver', 'gold')[i % 3],
+        'achieved_at': ['2019-%02d-%02d 12:%02d:00' % (i % 12 + 1, i % 28 + 1, i % 60)],
+    } for i in range(count)]
+
+
+def users(count):
+    return [{
+        'id': i,
+        'login': 'user_%d' % (i,),
+        'firstname': 'First',
+        'lastname': 'Last',
+        'email': 'user_%d@etna-alternance.net' % (i,),
+        'close': False,
+        'roles': ['student'],
+        'created_at': '2018-09-01 10:00:00',
+        'updated_at': '2019-02-12 18:04:12',
+        'deleted_at': None,
+    } for i in range(count)]
+
+
+def measure(name, cls, data, access):
+    seconds = min(timeit.repeat(lambda: [cls(x) for x in data], number=1, repeat=5))
+    accessed = min(timeit.repeat(lambda: [access(cls(x)) for x in data], number=1, repeat=5))
+
+    tracemalloc.start()
+    objects = [cls(x) for x in data]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    print('%-12s build %8.1f ms   build+date %8.1f ms   memory %8.1f KiB' % (
+        name, seconds * 1000, accessed * 1000, size / 1024))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    print('%d trophies' % (count,))
+    data = trophies(count)
+    measure('eager', EagerTrophy, data, lambda t: t.achieved_at)
+    measure('lazy', Trophy, data, lambda t: t.achieved_at)
+
+    print('%d users' % (count,))
+    data = users(count)
+    measure('eager', EagerUser, data, lambda u: u.updated_at)
+    measure('lazy', User, data, lambda u: u.updated_at)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+#coding: utf-8
+
+"""
+Local stand-in of the ETNA intranet for the benchmarks.
+
+Serves the routes of auth, intra-api and achievements used by
+:class:`etnapy.Intra` under the ``/auth``, ``/intra`` and ``/achievements``
+prefixes, with synthetic users, promos, trophies and wall conversations.
+The latency, the size of the payloads and the rate of errors are
+configurable, so the client can be measured without any network.
+
+Usage: python benchmarks/mock_server.py [--port 8000] [--latency 0.02] ...
+
+Then point the client at it::
+
+    intra = Intra(base_urls=base_urls('http://127.0.0.1:8000'))
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs, unquote
+
+
+TROPHY_TYPES = ('bronze', 'silver', 'gold', 'platinum')
+
+
+def base_urls(root):
+    """Returns the ``base_urls`` of :class:`etnapy.Intra` for a mock server
+    listening at ``root``.
+    """
+
+    return {
+        'auth': root + '/auth',
+        'intra': root + '/intra',
+        'achievements': root + '/achievements',
+    }
+
+
+def login_of(index):
+    return 'user_%04d' % (index,)
+
+
+class Dataset():
+    """Deterministic synthetic content of the intranet. The payloads are
+    encoded once and kept, so serving them costs as little as possible.
+    """
+
+    def __init__(self, users=200, trophies=30, promos=2, walls=5, conversations=500,
+                 message_size=200, avatar_size=16 * 1024, picture_size=4 * 1024, seed=0):
+        self.users = users
+        self.trophies = trophies
+        self.promos = promos
+        self.walls = ['Wall %d' % (i,) for i in range(walls)]
+        self.conversations = conversations
+        self.message_size = message_size
+        rnd = random.Random(seed)
+        self.avatar = bytes(rnd.getrandbits(8) for _ in range(avatar_size))
+        self.picture = self.avatar[:picture_size] or b'\0'
+        self.seed = seed
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def index_of(self, login):
+        match = re.match(r'^user_(\d+)$', login)
+        if match is None or int(match.group(1)) >= self.users:
+            return None
+        return int(match.group(1))
+
+    def _encode(self, key, build):
+        body = self._encoded.get(key)
+        if body is None:
+            body = json.dumps(build()).encode('utf-8')
+            with self._lock:
+                self._encoded[key] = body
+        return body
+
+    def user(self, index):
+        def build():
+            return {
+                'id': index,
+                'login': login_of(index),
+                'firstname': 'First%d' % (index,),
+                'lastname': 'Last%d' % (index,),
+                'email': '%s@etna-alternance.net' % (login_of(index),),
+                'close': False if index % 10 else '2019-06-30 23:59:59',
+                'roles': ['student'],
+                'created_at': '2018-09-01 10:00:00',
+                'updated_at': '2019-02-12 18:04:12',
+                'deleted_at': None,
+            }
+        return self._encode(('user', index), build)
+
+    def user_promos(self, index):
+        def build():
+            return [{
+                'id': index % 7 + i,
+                'target_name': 'Bachelor',
+                'term_name': 'Term %d' % (i,),
+                'learning_start': '2018-09-01',
+                'learning_end': '2019-08-31',
+                'learning_duration': 365,
+                'promo': 2021 + i,
+                'spe': 'Dev',
+                'wall_name': self.walls[(index + i) % len(self.walls)] if self.walls else '',
+            } for i in range(self.promos)]
+        return self._encode(('promos', index), build)
+
+    def user_trophies(self, index):
+        def build():
+            rnd = random.Random(self.seed * 7919 + index)
+            return [{
+                'id': rnd.randrange(300),
+                'name': 'Trophy %d' % (i,),
+                'description': 'Awarded for achievement %d' % (i,),
+                'type': TROPHY_TYPES[rnd.randrange(len(TROPHY_TYPES))],
+                'achieved_at': ['2019-%02d-%02d %02d:%02d:00' % (
+                    rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59))],
+            } for i in range(self.trophies)]
+        return self._encode(('trophies', index), build)
+
+    def walls_list(self):
+        return self._encode(('walls',), lambda: list(self.walls))
+
+    def conversation(self, wall, number):
+        text = ('lorem ipsum dolor sit amet ' * (self.message_size // 27 + 1))[:self.message_size]
+        return {
+            'id': (self.walls.index(wall) + 1) * 1000000 + self.conversations - number,
+            'title': 'Conversation %d' % (number,),
+            'user': {'login': login_of(number % max(self.users, 1))},
+            'created_at': '2019-%02d-%02d 12:00:00' % (number % 12 + 1, number % 28 + 1),
+            'messages': [{'content': text}],
+        }
+
+    def wall_page(self, wall, start, stop):
+        def build():
+            stop_ = min(stop, self.conversations)
+            return {
+                'total': self.conversations,
+                'hits': [self.conversation(wall, n) for n in range(start, stop_)],
+            }
+        return self._encode(('wall', wall, start, stop), build)
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+    allow_reuse_address = True
+
+    def __init__(self, address, dataset, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 session_ttl=3600):
+        HTTPServer.__init__(self, address, MockHandler)
+        self.dataset = dataset
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.session_ttl = session_ttl
+        self.sessions = set()
+        self.served = 0
+
+    @property
+    def root(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body leave in a single segment: no Nagle/delayed ACK stall.
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ('GET', re.compile(r'^/auth/api/users/([^/]+)$'), 'user'),
+        ('GET', re.compile(r'^/auth/api/users/([^/]+)/photo$'), 'avatar'),
+        ('GET', re.compile(r'^/intra/promo$'), 'promo'),
+        ('GET', re.compile(r'^/intra/walls$'), 'walls'),
+        ('GET', re.compile(r'^/intra/walls/([^/]+)/conversations$'), 'conversations'),
+        ('GET', re.compile(r'^/achievements/api/users/([^/]+)/achievements$'), 'trophies'),
+        ('GET', re.compile(r'^/achievements/api/achievements/(\d+)\.png$'), 'picture'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.reply(200, b'', 'text/plain')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def reply(self, status, body, content_type='application/json', headers=()):
+        etag = None
+        if status == 200 and body:
+            etag = '"%s"' % (hashlib.md5(body).hexdigest(),)
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def session(self):
+        cookie = self.headers.get('Cookie') or ''
+        match = re.search(r'authenticator=([^;]+)', cookie)
+        return match.group(1) if match and match.group(1) in self.server.sessions else None
+
+    def dispatch(self, method):
+        server = self.server
+        server.served += 1
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            return self.reply(server.error_status, b'{"error": "injected"}')
+
+        url = urlsplit(self.path)
+        path = url.path
+        if path == '/auth/identity':
+            return self.identity(method, body)
+        if self.session() is None:
+            return self.reply(401, b'{"error": "not logged"}')
+
+        dataset = server.dataset
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match is None:
+                continue
+            query = parse_qs(url.query)
+            if name == 'walls':
+                return self.reply(200, dataset.walls_list())
+            if name == 'picture':
+                return self.reply(200, dataset.picture, 'image/png')
+            if name == 'conversations':
+                wall = unquote(match.group(1))
+                if wall not in dataset.walls:
+                    break
+                start = int(query.get('from', ['0'])[0])
+                size = int(query.get('size', ['20'])[0])
+                return self.reply(200, dataset.wall_page(wall, start, start + size))
+            login = match.group(1) if match.groups() else query.get('login', [''])[0]
+            index = dataset.index_of(login)
+            if index is None:
+                break
+            if name == 'user':
+                return self.reply(200, dataset.user(index))
+            if name == 'avatar':
+                return self.reply(200, dataset.avatar, 'image/jpeg')
+            if name == 'promo':
+                return self.reply(200, dataset.user_promos(index))
+            if name == 'trophies':
+                return self.reply(200, dataset.user_trophies(index))
+        return self.reply(404, b'{"error": "not found"}')
+
+    def identity(self, method, body):
+        server = self.server
+        if method == 'POST':
+            form = parse_qs(body.decode('utf-8'))
+            login = form.get('login', [''])[0]
+            if not login or form.get('password', [''])[0] == 'wrong':
+                return self.reply(401, b'{"error": "bad credentials"}')
+            token = hashlib.sha1(('%s:%f' % (login, time.time())).encode('utf-8')).hexdigest()
+            server.sessions.add(token)
+            cookie = 'authenticator=%s; Path=/; Expires=%s' % (
+                token, formatdate(time.time() + server.session_ttl, usegmt=True))
+            payload = json.dumps({'id': 1, 'login': login, 'email': '%s@etna-alternance.net' % (login,),
+                                  'logas': False, 'groups': ['student']}).encode('utf-8')
+            return self.reply(200, payload, headers=[('Set-Cookie', cookie)])
+        token = self.session()
+        if token is None:
+            return self.reply(401, b'{"error": "not logged"}')
+        if method == 'DELETE':
+            server.sessions.discard(token)
+            return self.reply(200, b'{}')
+        return self.reply(200, b'{"login": "benchmark"}')
+
+
+def serve(host='127.0.0.1', port=0, dataset=None, **options):
+    """Creates a :class:`MockServer`, not yet serving. ``port=0`` picks a
+    free port, read it back from :attr:`MockServer.root`.
+    """
+
+    return MockServer((host, port), dataset or Dataset(), **options)
+
+
+def _run(queue, host, port, dataset_options, options):
+    server = serve(host, port, Dataset(**dataset_options), **options)
+    queue.put(server.root)
+    server.serve_forever()
+
+
+def start_process(host='127.0.0.1', port=0, dataset_options=None, **options):
+    """Starts a mock server in a child process, so that it does not share
+    the interpreter lock with the client measured.
+
+    Returns
+    -------
+    tuple
+        The :class:`multiprocessing.Process` and the root URL of the server.
+    """
+
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(queue, host, port, dataset_options or {}, options))
+    process.daemon = True
+    process.start()
+    return process, queue.get(timeout=30)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('mock server')
+    group.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    group.add_argument('--jitter', type=float, default=0.0, help='random extra latency, up to this many seconds')
+    group.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    group.add_argument('--error-status', type=int, default=503, help='status of the injected errors')
+    group.add_argument('--users', type=int, default=200, help='number of synthetic users')
+    group.add_argument('--trophies', type=int, default=30, help='trophies per user')
+    group.add_argument('--promos', type=int, default=2, help='promos per user')
+    group.add_argument('--walls', type=int, default=5, help='number of walls')
+    group.add_argument('--conversations', type=int, default=500, help='conversations per wall')
+    group.add_argument('--message-size', type=int, default=200, help='bytes of text per conversation')
+    group.add_argument('--avatar-size', type=int, default=16 * 1024, help='bytes of an avatar')
+    group.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+
+
+def options_from(args):
+    """Splits parsed arguments into the dataset and the server options."""
+
+    dataset = {
+        'users': args.users, 'trophies': args.trophies, 'promos': args.promos, 'walls': args.walls,
+        'conversations': args.conversations, 'message_size': args.message_size,
+        'avatar_size': args.avatar_size, 'seed': args.seed,
+    }
+    server = {
+        'latency': args.latency, 'jitter': args.jitter,
+        'error_rate': args.error_rate, 'error_status': args.error_status,
+    }
+    return dataset, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    dataset, options = options_from(args)
+    server = serve(args.host, args.port, Dataset(**dataset), **options)
+    print('Serving the mock intranet on %s' % (server.root,))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
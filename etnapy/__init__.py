@@ -13,7 +13,61 @@ __author__ = 'Yohann MARTIN'
 __license__ = 'MIT'
 __version__ = "1.0.0"
 
-from .user import User
-from .promo import Promo
-from .trophy import Trophy
-from .etnapy import Intra
+import importlib
+
+# The classes are imported on first access (PEP 562), so that importing
+# the package, or running ``python -m etnapy --help``, does not pay for
+# requests, aiohttp or sqlite3 until they are used.
+_LAZY = {
+    'User': 'user',
+    'Promo': 'promo',
+    'Trophy': 'trophy',
+    'Wall': 'wall',
+    'WallPageError': 'wall',
+    'Intra': 'etnapy',
+    'AsyncIntra': 'aio',
+    'IntraPool': 'pool',
+    'ResponseCache': 'cache',
+    'CacheEntry': 'cache',
+    'SQLiteCache': 'store',
+    'AssetStore': 'assets',
+    'TrophyTable': 'table',
+    'Leaderboard': 'leaderboard',
+    'RateLimiter': 'ratelimit',
+    'TokenBucket': 'ratelimit',
+    'AdaptiveLimit': 'ratelimit',
+    'PoolingAdapter': 'adapter',
+    'PoolStats': 'adapter',
+    'SingleFlight': 'singleflight',
+    'Metrics': 'metrics',
+    'Histogram': 'metrics',
+    'to_prometheus': 'metrics',
+    'Tracer': 'tracing',
+    'Span': 'tracing',
+    'SlowRequestLog': 'tracing',
+    'Cassette': 'cassette',
+    'CassetteMiss': 'cassette',
+    'WallWatcher': 'watcher',
+    'WallEvent': 'watcher',
+    'WallIndex': 'search',
+    'DataLoader': 'loader',
+    'Exporter': 'export',
+    'ExportStats': 'export',
+    'NDJSONWriter': 'export',
+    'CSVWriter': 'export',
+    'ParquetWriter': 'export',
+    'SessionFile': 'session',
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
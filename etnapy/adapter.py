@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import queue
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+class PoolStats():
+    """The connection statistics of a host.
+
+    Attributes
+    -----------
+    requests: int
+        The number of connections taken from the pool.
+    connects: int
+        The number of connections (TCP and TLS handshakes) established.
+    connect_time: float
+        The total time spent establishing connections, in seconds.
+    waits: int
+        The number of times a caller waited for a connection because all
+        of them were in use.
+    wait_time: float
+        The total time spent waiting for a connection, in seconds.
+    reaped: int
+        The number of idle connections closed by :func:`PoolingAdapter.reap_idle`.
+    """
+
+    __slots__ = ('requests', 'connects', 'connect_time', 'waits', 'wait_time', 'reaped')
+
+    def __init__(self):
+        self.requests = 0
+        self.connects = 0
+        self.connect_time = 0.0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.reaped = 0
+
+    @property
+    def reuse_rate(self):
+        """A property that returns the ratio of requests sent on an already
+        established connection.
+        """
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1.0 - self.connects / self.requests)
+
+    def to_dict(self):
+        """Returns the statistics as a dict."""
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result['reuse_rate'] = self.reuse_rate
+        return result
+
+class PoolingAdapter(HTTPAdapter):
+    """A :class:`requests.adapters.HTTPAdapter` with per-host pool sizes,
+    idle connections reaping and connection statistics.
+
+    Parameters
+    ----------
+    pool_maxsize : int or dict
+        The number of connections kept per host, or a dict mapping host
+        names to their number of connections. Hosts missing from the dict
+        keep ``default_maxsize`` connections.
+    pool_block : bool
+        If ``True``, a caller waits for a free connection when the pool of
+        the host is exhausted instead of opening a connection that will not
+        be kept.
+    default_maxsize : int
+        The number of connections of the hosts missing from ``pool_maxsize``.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['host_maxsize']
+
+    def __init__(self, pool_maxsize=10, pool_block=False, default_maxsize=10, **kwargs):
+        if isinstance(pool_maxsize, dict):
+            self.host_maxsize = dict(pool_maxsize)
+            pool_maxsize = default_maxsize
+        else:
+            self.host_maxsize = {}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        super().__init__(pool_maxsize=pool_maxsize, pool_block=pool_block, **kwargs)
+
+    def __setstate__(self, state):
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        super().__setstate__(state)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._pool_class(HTTPConnectionPool),
+            'https': self._pool_class(HTTPSConnectionPool),
+        }
+
+    def host_stats(self, host):
+        """Returns the :class:`PoolStats` of a host."""
+
+        stats = self._stats.get(host)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(host, PoolStats())
+        return stats
+
+    def pop_connect_time(self):
+        """Returns the time spent establishing connections by the calling
+        thread since the previous call, in seconds.
+        """
+
+        elapsed = getattr(self._local, 'connect_time', 0.0)
+        self._local.connect_time = 0.0
+        return elapsed
+
+    def stats(self):
+        """Returns a dict mapping each host to its statistics."""
+
+        return {host: stats.to_dict() for host, stats in list(self._stats.items())}
+
+    def _pool_class(self, base):
+        adapter = self
+
+        class Connection(base.ConnectionCls):
+            def connect(self):
+                start = time.monotonic()
+                super().connect()
+                elapsed = time.monotonic() - start
+                adapter._local.connect_time = getattr(adapter._local, 'connect_time', 0.0) + elapsed
+                stats = adapter.host_stats(self.host)
+                with adapter._stats_lock:
+                    stats.connects += 1
+                    stats.connect_time += elapsed
+
+        class Pool(base):
+            ConnectionCls = Connection
+
+            def __init__(self, host, port=None, **kwargs):
+                if host in adapter.host_maxsize:
+                    kwargs['maxsize'] = adapter.host_maxsize[host]
+                super().__init__(host, port, **kwargs)
+                self.last_used = time.monotonic()
+
+            def _get_conn(self, timeout=None):
+                exhausted = self.block and self.pool is not None and self.pool.empty()
+                start = time.monotonic()
+                conn = super()._get_conn(timeout)
+                stats = adapter.host_stats(self.host)
+                with adapter._stats_lock:
+                    stats.requests += 1
+                    if exhausted:
+                        stats.waits += 1
+                        stats.wait_time += time.monotonic() - start
+                return conn
+
+            def _put_conn(self, conn):
+                self.last_used = time.monotonic()
+                super()._put_conn(conn)
+
+            def drain(self):
+                # Close the idle connections, keeping the pool usable.
+                conns = []
+                try:
+                    while True:
+                        conns.append(self.pool.get(block=False))
+                except (queue.Empty, AttributeError):
+                    pass
+                closed = 0
+                for conn in conns:
+                    if conn is not None:
+                        conn.close()
+                        closed += 1
+                    self.pool.put(None, block=False)
+                return closed
+
+        return Pool
+
+    def reap_idle(self, max_idle):
+        """Close the connections of the hosts not used for ``max_idle``
+        seconds.
+
+        Returns
+        -------
+        int
+            The number of connections closed.
+        """
+
+        now = time.monotonic()
+        closed = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None or not hasattr(pool, 'drain') or now - pool.last_used < max_idle:
+                continue
+            count = pool.drain()
+            if count:
+                stats = self.host_stats(pool.host)
+                with self._stats_lock:
+                    stats.reaped += count
+                closed += count
+        return closed
@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import functools
+import ipaddress
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .user import User
+from .wall import WallPageError, page_conversations, page_total
+from .singleflight import SingleFlight
+from .jsonlib import get_loads
+from .loader import DataLoader
+from .request import JsonRequest, build_promos, build_trophies, finish_json
+from .etnapy import Intra
+
+async def _on_connect_start(session, context, params):
+    context.connect_start = time.monotonic()
+
+async def _on_connect_end(session, context, params):
+    span = context.trace_request_ctx
+    if span is not None:
+        span.add('connect', time.monotonic() - context.connect_start)
+
+def _is_ip(url):
+    try:
+        ipaddress.ip_address(urlsplit(url).hostname or '')
+    except ValueError:
+        return False
+    return True
+
+def _trace_transfer(span, start, headers_at, connect):
+    if headers_at is None:
+        return
+    connect = span.phases.get('connect', 0.0) - connect
+    span.add('ttfb', headers_at - start - connect)
+    span.add('download', time.monotonic() - headers_at)
+
+class AsyncIntra():
+    """Represents the ETNA intranet for asyncio applications. This class
+    give the same functions as :class:`Intra` but every network call is
+    a coroutine running on a non-blocking HTTP client.
+
+    The underlying :class:`aiohttp.ClientSession` is created on first use,
+    so the instance can be built outside of a running event loop. Call
+    :func:`close` (or use ``async with``) to release its connection pool.
+
+    Parameters
+    ----------
+    limit : int
+        The maximum number of simultaneous connections of the pool.
+    limit_per_host : int
+        The maximum number of simultaneous connections to the same host.
+        ``0`` means no limit other than ``limit``.
+    timeout : float
+        The total timeout of a request in seconds.
+    cache : Optional[:class:`ResponseCache` or :class:`SQLiteCache`]
+        The cache of the responses, ``None`` to disable it.
+    limiter : Optional[:class:`RateLimiter`]
+        The rate limiter of the requests, ``None`` to disable it.
+    coalesce : bool
+        If ``True``, identical concurrent calls share a single request.
+    metrics : Optional[:class:`Metrics`]
+        The registry recording the metrics of the requests.
+    tracer : Optional[:class:`Tracer`]
+        The tracer receiving the timing of every request.
+    base_urls : Optional[dict]
+        Overrides of :attr:`BASE_URLS`, see :class:`Intra`.
+    json_backend : str
+        The library decoding the responses, see :class:`Intra`.
+
+    Attributes
+    -----------
+    etna_login: str
+        The login of the user connected.
+    is_logged: bool
+        A boolean to know if an user is connected.
+    singleflight: Optional[:class:`SingleFlight`]
+        The tracker of the concurrent calls, counting the collapsed ones.
+        ``None`` if disabled.
+    metrics: Optional[:class:`Metrics`]
+        The registry of the metrics of the requests, ``None`` if disabled.
+    tracer: Optional[:class:`Tracer`]
+        The tracer of the requests, ``None`` if disabled.
+    base_urls: dict
+        The base URLs of the services of the intranet.
+    wall_markers: dict
+        The ID of the newest conversation seen on each wall by
+        :func:`iter_wall_updates`.
+    expires_at: Optional[float]
+        The timestamp at which the session cookie expires, ``None`` if
+        unknown.
+    last_success: Optional[float]
+        The timestamp of the last successful request. Without a cookie
+        expiry, the session is believed stale :attr:`MAX_IDLE` seconds
+        after it.
+    """
+
+    #: Seconds before the cookie expiry from which the session is renewed.
+    REFRESH_MARGIN = 60
+
+    #: Seconds without a successful request after which a session whose
+    #: cookie has no expiry is renewed.
+    MAX_IDLE = 3600
+
+    #: Seconds after a login during which a ``403`` is not considered as
+    #: an expired session but as a genuine permission error.
+    REAUTH_COOLDOWN = 30
+
+    #: The base URLs of the services of the intranet.
+    BASE_URLS = Intra.BASE_URLS
+
+    def __init__(self, limit=100, limit_per_host=0, timeout=30, cache=None, limiter=None, coalesce=True,
+                 metrics=None, tracer=None, base_urls=None, json_backend='json'):
+        if aiohttp is None:
+            raise RuntimeError('AsyncIntra requires aiohttp, install it with "pip install etnapy[async]"')
+        self.base_urls = dict(self.BASE_URLS, **(base_urls or {}))
+        self._loads = get_loads(json_backend)
+        self._loaders = {}
+        self.session = None
+        self.wall_markers = {}
+        self.etna_login = ""
+        self.is_logged = False
+        self.user = ""
+        self.pwd = ""
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._timeout = timeout
+        self.cache = cache
+        self.limiter = limiter
+        self.singleflight = SingleFlight() if coalesce else None
+        self.metrics = metrics
+        self.tracer = tracer
+        self.expires_at = None
+        self.last_success = None
+        self._logged_at = 0
+        self._auth_lock = None
+        self._auth_generation = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host)
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_start.append(_on_connect_start)
+            trace.on_connection_create_end.append(_on_connect_end)
+            # aiohttp drops the cookies of IP hosts unless told otherwise,
+            # which a mirror reached by its address would need.
+            unsafe = any(_is_ip(url) for url in self.base_urls.values())
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(unsafe=unsafe),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                trace_configs=[trace]
+            )
+        return self.session
+
+    def _cookie_expiry(self):
+        expires = []
+        for morsel in self._get_session().cookie_jar:
+            if morsel['max-age']:
+                expires.append(time.time() + int(morsel['max-age']))
+            elif morsel['expires']:
+                expires.append(parsedate_to_datetime(morsel['expires']).timestamp())
+        return min(expires) if expires else None
+
+    def is_session_valid(self):
+        """Returns ``True`` if the session is believed to be valid, without
+        sending any request. The belief is based on the cookie expiry or,
+        when the cookie has none, on the time of the last successful
+        request. A session rejected by the server is detected on the next
+        request.
+        """
+
+        if not self.is_logged:
+            return False
+        if self.expires_at is not None:
+            return time.time() < self.expires_at - self.REFRESH_MARGIN
+        return self.last_success is not None and time.time() - self.last_success < self.MAX_IDLE
+
+    async def _relogin(self, generation):
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if generation != self._auth_generation or not self.user:
+                return
+            if await self._authenticate(self.user, self.pwd) is None:
+                self.etna_login = ""
+                self.is_logged = False
+
+    async def _request(self, method, url, endpoint=None, span=None, **kwargs):
+        """Send a request through the rate limiter, if any, read its body
+        and record it in the metrics and the tracer, if any. ``endpoint`` is
+        the name of the calling method. The phases are added to ``span`` if
+        given, else to a new span emitted once the request is done.
+        """
+
+        limiter = self.limiter
+        metrics = self.metrics
+        tracer = self.tracer
+        own_span = tracer is not None and span is None
+        if own_span:
+            span = tracer.start(endpoint, method, url)
+
+        host = urlsplit(url).hostname
+        connect = span.phases.get('connect', 0.0) if span is not None else 0.0
+        start = time.monotonic()
+        headers_at = None
+        # Whether the request got through the limiter and holds a slot.
+        admitted = limiter is None
+        try:
+            if limiter is not None:
+                waited = await limiter.acquire_async(host)
+                admitted = True
+                if span is not None:
+                    span.add('queue', waited)
+                start = time.monotonic()
+            res = await self._get_session().request(method, url, trace_request_ctx=span, **kwargs)
+            headers_at = time.monotonic()
+            # Reading the whole body gives the connection back to the pool,
+            # while the body stays available to the callers.
+            body = await res.read()
+        except BaseException as e:
+            latency = time.monotonic() - start
+            if admitted:
+                if limiter is not None:
+                    if isinstance(e, asyncio.CancelledError):
+                        # Abandoned by the caller, e.g. an early stop of
+                        # iter_wall: not a sign of congestion.
+                        limiter.cancel(host)
+                    else:
+                        limiter.release(host, None, latency)
+                if metrics is not None:
+                    metrics.record_request(endpoint, host, None, latency)
+            if span is not None:
+                span.error = repr(e)
+                _trace_transfer(span, start, headers_at, connect)
+                if own_span:
+                    tracer.emit(span)
+            raise
+
+        latency = time.monotonic() - start
+        if limiter is not None:
+            limiter.release(host, res.status, latency, res.headers.get('Retry-After'))
+        if metrics is not None:
+            metrics.record_request(endpoint, host, res.status, latency, len(body))
+        if span is not None:
+            span.status = res.status
+            _trace_transfer(span, start, headers_at, connect)
+            if own_span:
+                tracer.emit(span)
+        return res
+
+    async def _send(self, method, url, endpoint=None, span=None, **kwargs):
+        """Send a request and read its body. If the server answers ``401``
+        or ``403`` the session is renewed and the request is sent once more.
+        """
+
+        generation = self._auth_generation
+        res = await self._request(method, url, endpoint, span, **kwargs)
+
+        if res.status in (401, 403) and self.user:
+            if res.status == 401 or time.monotonic() - self._logged_at > self.REAUTH_COOLDOWN:
+                await self._relogin(generation)
+                res = await self._request(method, url, endpoint, span, **kwargs)
+
+        if res.status < 400:
+            self.last_success = time.time()
+        return res
+
+    async def _get_json(self, endpoint, url, login=None, build=None):
+        if self.singleflight is None:
+            data, span = await self._fetch_json(endpoint, url, login)
+            return finish_json(self, endpoint, build, data, span)
+
+        leader = []
+
+        async def fetch():
+            leader.append(True)
+            return await self._fetch_json(endpoint, url, login)
+
+        data, span = await self.singleflight.do_async(url, fetch)
+        return finish_json(self, endpoint, build, data, span, bool(leader))
+
+    async def _fetch_json(self, endpoint, url, login):
+        request = JsonRequest(self, endpoint, url, login)
+        if request.lookup():
+            return request.entry.data, None
+        try:
+            res = await self._send('GET', url, endpoint, request.span, headers=request.headers)
+        except BaseException:
+            request.failed()
+            raise
+
+        if request.revalidated(res.status):
+            return request.entry.data, request.span
+        if res.status != 200:
+            return None, request.span
+        return request.decode(await res.read(), res.headers), request.span
+
+    async def _get_bytes(self, endpoint, url):
+        res = await self._send('GET', url, endpoint)
+        if res.status == 200:
+            return await res.read()
+        return None
+
+    async def login(self, user, password):
+        """|coro|
+
+        Establish a connection with the intranet.
+
+        Parameters
+        ----------
+        user : str
+            The username.
+        password : str
+            The password.
+
+        Returns
+        -------
+        dict or ``None``
+            A json dict with some information about the user. Prefer the
+            method :func:`user_info` for getting user information.
+            Returns ``None`` if the connection failed.
+        """
+
+        if self.is_logged:
+            return None
+
+        return await self._authenticate(user, password)
+
+    async def _authenticate(self, user, password):
+        payload = {'login': user, 'password': password}
+        res = await self._request('POST', self.base_urls['auth'] + '/identity', 'login', data=payload)
+        if res.status != 200:
+            return None
+        data = self._loads(await res.read())
+
+        self.is_logged = True
+        self.user = user
+        self.pwd = password
+        self.etna_login = data["login"]
+        self.expires_at = self._cookie_expiry()
+        self.last_success = time.time()
+        self._logged_at = time.monotonic()
+        self._auth_generation += 1
+        return data
+
+    def keep_alive(self, func):
+        """A simple decorator to make sure you're always connected.
+        This one accept and only accept asynchronous coroutines.
+
+        No request is sent to check the session: it is renewed only when
+        the cookie is about to expire, or when no request succeeded for
+        :attr:`MAX_IDLE` seconds if the cookie has no expiry. A session
+        rejected by the server is renewed by the request itself, which is
+        then replayed.
+        """
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not self.is_session_valid():
+                await self._relogin(self._auth_generation)
+            return await func(*args, **kwargs)
+        return wrapper
+
+    async def user_info(self, user_login=None):
+        """|coro|
+
+        Get information about an user.
+
+        Parameters
+        ----------
+        user_login : Optionnal[str]
+            The user login. If no login provided the current connected
+            user will be used.
+
+        Returns
+        -------
+        :class:`User` or ``None``
+            The user object containing the formatted information. ``None`` if
+            an error occured.
+        """
+
+        if not self.is_logged:
+            return None
+
+        if user_login is None:
+            user_login = self.etna_login
+
+        url = '%s/api/users/%s' % (self.base_urls['auth'], user_login)
+        return await self._get_json('user_info', url, user_login, functools.partial(User, client=self))
+
+    async def user_avatar(self, user_login=None):
+        """|coro|
+
+        Get the raw bytes of the user avatar.
+
+        Parameters
+        ----------
+        user_login : Optionnal[str]
+            The user login. If no login provided the current connected
+            user will be used.
+
+        Returns
+        -------
+        bytes or ``None``
+            The content of the avatar. ``None`` if an error occured.
+        """
+
+        if not self.is_logged:
+            return None
+
+        if user_login is None:
+            user_login = self.etna_login
+
+        url = '%s/api/users/%s/photo' % (self.base_urls['auth'], user_login)
+        return await self._get_bytes('user_avatar', url)
+
+    async def user_promo(self, user_login=None):
+        """|coro|
+
+        Get information about an user's promotion.
+
+        Parameters
+        ----------
+        user_login : Optionnal[str]
+            The user login. If no login provided the current connected
+            user will be used.
+
+        Returns
+        -------
+        list of :class:`Promo` or ``None``
+            A list of promotion objects containing the formatted information.
+            ``None`` if an error occured.
+        """
+
+        if not self.is_logged:
+            return None
+
+        if user_login is None:
+            user_login = self.etna_login
+
+        url = '%s/promo?login=%s' % (self.base_urls['intra'], user_login)
+        return await self._get_json('user_promo', url, user_login, functools.partial(build_promos, client=self))
+
+    async def walls_list(self):
+        """|coro|
+
+        Get all the connected user's walls.
+
+        Returns
+        -------
+        list of str or ``None``
+            A list of walls name. ``None`` if an error occured.
+        """
+
+        if not self.is_logged:
+            return None
+
+        return await self._get_json('walls_list', self.base_urls['intra'] + '/walls')
+
+    async def wall_messages(self, wall_name, start, stop):
+        """|coro|
+
+        Get wall's messages.
+
+        Parameters
+        ----------
+        wall_name : str
+            The name of the wall.
+        start: int
+            The start index of the messages. Start from 0.
+        stop: int
+            The stop index of the messages.
+
+        Returns
+        -------
+        dict or ``None``
+            A json object of the messages.
+        """
+
+        if not self.is_logged:
+            return None
+
+        url = '%s/walls/%s/conversations?from=%d&size=%d' % (self.base_urls['intra'], wall_name, start, stop)
+        return await self._get_json('wall_messages', url)
+
+    async def iter_wall(self, wall_name, page_size=20, until=None):
+        """Asynchronously iterate over the conversations of a wall, from the
+        newest. See :func:`Intra.iter_wall`, the next page is fetched in a
+        background task while the current one is consumed.
+        """
+
+        start = 0
+        task = asyncio.ensure_future(self.wall_messages(wall_name, start, page_size))
+        try:
+            while task is not None:
+                page = await task
+                if page is None:
+                    task = None
+                    raise WallPageError(wall_name, start)
+                conversations = page_conversations(page)
+                start += len(conversations)
+                total = page_total(page)
+
+                task = None
+                if len(conversations) == page_size and (total is None or start < total):
+                    task = asyncio.ensure_future(self.wall_messages(wall_name, start, page_size))
+
+                for conversation in conversations:
+                    if until is not None and conversation.get('id') == until:
+                        return
+                    yield conversation
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def iter_wall_updates(self, wall_name, page_size=20):
+        """Asynchronously iterate over the conversations of a wall posted
+        since the last call for this wall. See :func:`Intra.iter_wall_updates`.
+        """
+
+        newest = None
+        async for conversation in self.iter_wall(wall_name, page_size, self.wall_markers.get(wall_name)):
+            if newest is None:
+                newest = conversation.get('id')
+            yield conversation
+        if newest is not None:
+            self.wall_markers[wall_name] = newest
+
+    async def user_trophy(self, user_login=None):
+        """|coro|
+
+        Get user's trophy.
+
+        Parameters
+        ----------
+        user_login : Optionnal[str]
+            The user login. If no login provided the current connected
+            user will be used.
+
+        Returns
+        -------
+        list of :class:`Trophy` or ``None``
+            The list of Trophy objects.
+        """
+
+        if not self.is_logged:
+            return None
+
+        if user_login is None:
+            user_login = self.etna_login
+
+        url = '%s/api/users/%s/achievements' % (self.base_urls['achievements'], user_login)
+        return await self._get_json('user_trophy', url, user_login, functools.partial(build_trophies, client=self))
+
+    async def trophy_picture(self, id_trophy):
+        """|coro|
+
+        Get a tuple with the URL of the trophy avatar and the raw
+        content (bytes) of the avatar.
+
+        Parameters
+        ----------
+        id_trophy : int
+            The unique ID of a trophy.
+        """
+
+        if not self.is_logged:
+            return None, None
+
+        url = '%s/api/achievements/%d.png' % (self.base_urls['achievements'], id_trophy)
+        content = await self._get_bytes('trophy_picture', url)
+        if content is None:
+            return None, None
+        return url, content
+
+    def _iter_bulk(self, func, logins, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(login):
+            async with semaphore:
+                try:
+                    return login, await func(login)
+                except Exception as e:
+                    return login, e
+
+        return asyncio.as_completed([run(login) for login in dict.fromkeys(logins)])
+
+    def iter_users_info(self, logins, concurrency=50):
+        """Get information about many users concurrently.
+
+        Parameters
+        ----------
+        logins : iterable of str
+            The users logins. Duplicates are fetched only once.
+        concurrency : int
+            The maximum number of requests in flight.
+
+        Returns
+        -------
+        iterator of awaitables
+            Each awaitable resolves to a ``(login, result)`` tuple, in order
+            of completion. The result is a :class:`User`, ``None`` or the
+            :class:`Exception` raised while fetching it.
+        """
+
+        return self._iter_bulk(self.user_info, logins, concurrency)
+
+    async def users_info(self, logins, concurrency=50):
+        """|coro|
+
+        Get information about many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+
+        Returns
+        -------
+        dict
+            A dict mapping each login to its :class:`User`, ``None`` or the
+            :class:`Exception` raised while fetching it.
+        """
+
+        return dict([await x for x in self.iter_users_info(logins, concurrency)])
+
+    def iter_users_promo(self, logins, concurrency=50):
+        """Get the promotions of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+        """
+
+        return self._iter_bulk(self.user_promo, logins, concurrency)
+
+    async def users_promo(self, logins, concurrency=50):
+        """|coro|
+
+        Get the promotions of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+        """
+
+        return dict([await x for x in self.iter_users_promo(logins, concurrency)])
+
+    def iter_users_trophies(self, logins, concurrency=50):
+        """Get the trophies of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+        """
+
+        return self._iter_bulk(self.user_trophy, logins, concurrency)
+
+    async def users_trophies(self, logins, concurrency=50):
+        """|coro|
+
+        Get the trophies of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+        """
+
+        return dict([await x for x in self.iter_users_trophies(logins, concurrency)])
+
+    def _load(self, loader, key):
+        """Returns a future of the value of a :class:`~etnapy.utils.relation`
+        of a model. The relations requested during the same tick of the
+        event loop are fetched concurrently, in a single batch.
+        """
+
+        batcher = self._loaders.get(loader)
+        if batcher is None:
+            if loader == 'trophy_picture':
+                func = self._picture
+            else:
+                func = getattr(self, loader)
+
+            async def batch(keys):
+                return dict([await x for x in self._iter_bulk(func, keys, 50)])
+
+            # The models cache their relations, the client must not.
+            batcher = self._loaders[loader] = DataLoader(batch, cache=False)
+        return batcher.load(key)
+
+    async def _picture(self, id_trophy):
+        return (await self.trophy_picture(id_trophy))[1]
+
+    async def logout(self):
+        """|coro|
+
+        Log out from the intranet.
+        """
+
+        if not self.is_logged:
+            return
+        await self._request('DELETE', self.base_urls['auth'] + '/identity', 'logout')
+        self.is_logged = False
+        self.etna_login = ""
+        self.user = ""
+        self.pwd = ""
+        self.expires_at = None
+        self.last_success = None
+
+    async def close(self):
+        """|coro|
+
+        Close the underlying HTTP session and its connection pool.
+        """
+
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+# The stores whose pending changes are written when the interpreter exits.
+_open_stores = weakref.WeakSet()
+
+@atexit.register
+def _flush_open_stores():
+    for store in list(_open_stores):
+        try:
+            store.flush()
+        except OSError:
+            pass
+
+class AssetStore():
+    """A content-addressed store of binary assets (avatars and trophy
+    pictures) on the local disk. It can be given to :class:`Intra` so
+    :func:`Intra.user_avatar` and :func:`Intra.trophy_picture` serve
+    their repeated downloads from the disk.
+
+    Each asset is stored once per content hash, so a trophy picture shared
+    by many users takes the space of a single file. Downloads are streamed
+    to the disk by chunks. When an asset is older than ``ttl`` it is
+    revalidated on its next access with a conditional request. When the
+    total size of the stored files exceeds ``max_bytes`` the least recently
+    used assets are removed; a file is only removed once no key refers to
+    its hash and no download or reader holds it.
+
+    The first change of the index is written to the disk at once, the
+    following ones at most every ``save_interval`` seconds. The last
+    changes are written by :func:`flush`, which is called by :func:`close`,
+    when leaving a ``with`` block, by :func:`Intra.logout` and when the
+    interpreter exits.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the store. It is created if needed.
+    max_bytes : int
+        The size budget of the store in bytes.
+    ttl : float
+        The number of seconds an asset is served without revalidation.
+    chunk_size : int
+        The size of the chunks written to the disk while downloading.
+    save_interval : float
+        The shortest delay between two writes of the index, in seconds.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=86400, chunk_size=64 * 1024, save_interval=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.save_interval = save_interval
+        self._objects = os.path.join(path, 'objects')
+        self._index_path = os.path.join(path, 'index.json')
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._saved_at = float('-inf')
+        # Number of keys, size and pins of each stored hash, and the total
+        # size of the stored files.
+        self._refs = {}
+        self._sizes = {}
+        self._pins = {}
+        self._total = 0
+
+        os.makedirs(self._objects, exist_ok=True)
+        try:
+            with open(self._index_path, 'r') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+        for entry in self._index.values():
+            self._ref(entry)
+        _open_stores.add(self)
+
+    def _blob_path(self, digest):
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _ref(self, entry):
+        digest = entry['hash']
+        count = self._refs.get(digest, 0)
+        if count == 0:
+            self._sizes[digest] = entry['size']
+            self._total += entry['size']
+        self._refs[digest] = count + 1
+
+    def _unref(self, digest):
+        count = self._refs[digest] - 1
+        if count:
+            self._refs[digest] = count
+            return
+        del self._refs[digest]
+        self._total -= self._sizes.pop(digest)
+        if digest not in self._pins:
+            self._remove_blob(digest)
+
+    def _pin(self, digest):
+        self._pins[digest] = self._pins.get(digest, 0) + 1
+
+    def _unpin(self, digest):
+        with self._lock:
+            count = self._pins[digest] - 1
+            if count:
+                self._pins[digest] = count
+                return
+            del self._pins[digest]
+            if digest not in self._refs:
+                self._remove_blob(digest)
+
+    def _remove_blob(self, digest):
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+
+    def _put(self, key, entry):
+        old = self._index.get(key)
+        self._index[key] = entry
+        self._ref(entry)
+        if old is not None:
+            self._unref(old['hash'])
+        self._evict(key)
+        self._changed()
+
+    def _drop(self, key):
+        entry = self._index.pop(key)
+        self._unref(entry['hash'])
+
+    def _changed(self):
+        # The index is written at most every save_interval seconds, see
+        # flush.
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self._save()
+
+    def path_of(self, key):
+        """Returns the path of the file stored for a key, or ``None``."""
+
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            entry['used_at'] = time.time()
+            self._dirty = True
+            return self._blob_path(entry['hash'])
+
+    def fetch(self, key, url, get):
+        """Get the path of an asset, downloading or revalidating it if needed.
+
+        Parameters
+        ----------
+        key : str
+            The identifier of the asset, like ``trophy/42``.
+        url : str
+            The URL of the asset.
+        get : callable
+            Called with the URL and a dict of headers, it must return a
+            streamed :class:`requests.Response`.
+
+        Returns
+        -------
+        str or ``None``
+            The path of the stored file. ``None`` if an error occured.
+        """
+
+        digest = self._fetch(key, url, get, False)
+        return self._blob_path(digest) if digest is not None else None
+
+    def _fetch(self, key, url, get, pin):
+        """Returns the hash of the asset of a key, or ``None``. With
+        ``pin``, the hash is returned pinned: its file is not removed until
+        :func:`_unpin` is called.
+        """
+
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and not os.path.exists(self._blob_path(entry['hash'])):
+                self._drop(key)
+                entry = None
+            if entry is not None and time.time() - entry['fetched_at'] < self.ttl:
+                entry['used_at'] = time.time()
+                self._dirty = True
+                if pin:
+                    self._pin(entry['hash'])
+                return entry['hash']
+            if entry is not None:
+                # Keep the file while it is revalidated.
+                self._pin(entry['hash'])
+
+        try:
+            return self._download_entry(key, url, get, entry, pin)
+        finally:
+            if entry is not None:
+                self._unpin(entry['hash'])
+
+    def _download_entry(self, key, url, get, entry, pin):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        res = get(url, headers)
+        try:
+            if res.status_code == 304 and entry is not None:
+                now = time.time()
+                with self._lock:
+                    if self._index.get(key) is entry:
+                        entry['fetched_at'] = entry['used_at'] = now
+                        self._changed()
+                    else:
+                        # Evicted or replaced while revalidating.
+                        self._put(key, dict(entry, fetched_at=now, used_at=now))
+                    if pin:
+                        self._pin(entry['hash'])
+                    return entry['hash']
+            if res.status_code != 200:
+                return None
+            tmp_path, digest, size = self._download(res)
+        finally:
+            res.close()
+
+        now = time.time()
+        with self._lock:
+            # Publishing and indexing under the lock: an eviction cannot
+            # remove a blob shared with another key in between.
+            try:
+                blob_path = self._blob_path(digest)
+                if os.path.exists(blob_path):
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(tmp_path, blob_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._put(key, {
+                'hash': digest,
+                'size': size,
+                'etag': res.headers.get('ETag'),
+                'last_modified': res.headers.get('Last-Modified'),
+                'fetched_at': now,
+                'used_at': now,
+            })
+            if pin:
+                self._pin(digest)
+            return digest
+
+    def _download(self, res):
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects, prefix='.tmp-')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in res.iter_content(self.chunk_size):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def _evict(self, keep=None):
+        if self._total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda x: x[1]['used_at']):
+            if self._total <= self.max_bytes:
+                break
+            if key == keep or entry['hash'] in self._pins:
+                continue
+            self._drop(key)
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.index-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _open_pinned(self, digest, opener):
+        if digest is None:
+            return None
+        try:
+            return opener(self._blob_path(digest))
+        finally:
+            self._unpin(digest)
+
+    def open(self, key, url, get):
+        """Like :func:`fetch` but returns the stored file opened in binary
+        mode, or ``None``.
+        """
+
+        return self._open_pinned(self._fetch(key, url, get, True), lambda path: open(path, 'rb'))
+
+    def mmap(self, key):
+        """Map the stored file of a key in memory, read only.
+
+        Returns
+        -------
+        :class:`mmap.mmap` or ``None``
+            The mapping, ``None`` if the key is not stored or the file
+            is empty.
+        """
+
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or entry['size'] == 0:
+                return None
+            entry['used_at'] = time.time()
+            self._dirty = True
+            self._pin(entry['hash'])
+
+        def opener(path):
+            with open(path, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self._open_pinned(entry['hash'], opener)
+
+    def invalidate(self, key):
+        """Remove a key from the store."""
+
+        with self._lock:
+            if key in self._index:
+                self._drop(key)
+                self._changed()
+
+    def size(self):
+        """Returns the total size of the stored files in bytes."""
+
+        with self._lock:
+            return self._total
+
+    def flush(self):
+        """Write the pending changes of the index and the access times to
+        the disk.
+        """
+
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def close(self):
+        """Write the pending changes, see :func:`flush`."""
+
+        self.flush()
+        _open_stores.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
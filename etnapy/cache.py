@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class CacheEntry():
+    """Represents a cached response body.
+
+    Attributes
+    -----------
+    data
+        The decoded json body of the response.
+    etag: Optional[str]
+        The ``ETag`` header sent by the server, if any.
+    last_modified: Optional[str]
+        The ``Last-Modified`` header sent by the server, if any.
+    expires_at: float
+        The timestamp after which the entry must be revalidated.
+    login: Optional[str]
+        The login the response is about, used for invalidation.
+    """
+
+    __slots__ = ('data', 'etag', 'last_modified', 'expires_at', 'login')
+
+    def __init__(self, data, expires_at, login=None, etag=None, last_modified=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.login = login
+
+    def is_fresh(self, now=None):
+        """Returns ``True`` if the entry can be used without asking the server."""
+        return (time.time() if now is None else now) < self.expires_at
+
+    @property
+    def revalidable(self):
+        """A property that returns ``True`` if a conditional request can be
+        sent to revalidate the entry.
+        """
+        return self.etag is not None or self.last_modified is not None
+
+class ResponseCache():
+    """An in-memory, size-bounded LRU cache of the intranet responses, keyed
+    by endpoint URL.
+
+    Only the endpoints having a TTL are cached. When an entry expires it is
+    kept until evicted so it can be revalidated with a conditional request
+    (``If-None-Match`` / ``If-Modified-Since``), a ``304`` answer only
+    refreshing its expiry. The cache is safe to share between threads.
+
+    Parameters
+    ----------
+    maxsize : int
+        The maximum number of entries kept.
+    ttls : Optional[dict]
+        A dict mapping an :class:`Intra` method name to its time to live in
+        seconds, merged over :attr:`DEFAULT_TTLS`. A TTL of ``None`` disables
+        the cache for that method.
+
+    Attributes
+    -----------
+    hits: int
+        The number of lookups answered by a fresh entry.
+    misses: int
+        The number of lookups without a fresh entry.
+    revalidations: int
+        The number of stale entries refreshed by a ``304`` answer.
+    evictions: int
+        The number of entries dropped to respect ``maxsize``.
+    """
+
+    DEFAULT_TTLS = {
+        'user_info': 3600,
+        'user_promo': 3600,
+        'user_trophy': 600,
+    }
+
+    def __init__(self, maxsize=1024, ttls=None):
+        self.maxsize = maxsize
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._logins = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl(self, endpoint):
+        """Returns the time to live of an endpoint or ``None`` if it must not
+        be cached.
+        """
+        return self.ttls.get(endpoint)
+
+    def get(self, url):
+        """Get the entry of an URL, fresh or stale.
+
+        Returns
+        -------
+        :class:`CacheEntry` or ``None``
+            The entry or ``None`` if the URL is not cached.
+        """
+
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            if entry.is_fresh():
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def put(self, url, data, ttl, login=None, etag=None, last_modified=None, endpoint=None):
+        """Store the decoded body of an URL for ``ttl`` seconds."""
+
+        entry = CacheEntry(data, time.time() + ttl, login, etag, last_modified)
+        with self._lock:
+            self._discard(url)
+            self._entries[url] = entry
+            if login is not None:
+                self._logins.setdefault(login, set()).add(url)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def refresh(self, url, ttl):
+        """Extend the expiry of a revalidated entry."""
+
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry.expires_at = time.time() + ttl
+                self.revalidations += 1
+            return entry
+
+    def invalidate(self, login):
+        """Drop every entry about a login.
+
+        Returns
+        -------
+        int
+            The number of entries dropped.
+        """
+
+        with self._lock:
+            urls = self._logins.pop(login, ())
+            for url in urls:
+                self._entries.pop(url, None)
+            return len(urls)
+
+    def clear(self):
+        """Drop every entry. The counters are kept."""
+
+        with self._lock:
+            self._entries.clear()
+            self._logins.clear()
+
+    def stats(self):
+        """Returns a dict with the counters and the size of the cache."""
+
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+            }
+
+    def _discard(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None and entry.login is not None:
+            urls = self._logins.get(entry.login)
+            if urls is not None:
+                urls.discard(url)
+                if not urls:
+                    del self._logins[entry.login]
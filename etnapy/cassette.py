@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import base64
+import collections
+import gzip
+import io
+import json
+import re
+import threading
+import time
+from email.message import Message
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.response import HTTPResponse
+
+#: Response headers not recorded: the body is stored decoded and whole.
+_SKIPPED_HEADERS = frozenset(['content-encoding', 'transfer-encoding', 'connection', 'keep-alive',
+                              'content-length'])
+
+class CassetteMiss(requests.ConnectionError):
+    """Raised when a replayed request has no recorded response."""
+
+class _Original():
+    """Stands for the ``http.client`` response of a recorded response, so
+    that requests reads its cookies.
+    """
+
+    def __init__(self, headers):
+        self.msg = Message()
+        for name, value in headers:
+            self.msg[name] = value
+
+    def isclosed(self):
+        return True
+
+def _scrub_cookie(value):
+    # Keep the name and the scope of the cookie, drop its value and expiry
+    # so that a replayed session never looks expired.
+    parts = [p.strip() for p in value.split(';')]
+    name = parts[0].split('=', 1)[0]
+    attrs = [p for p in parts[1:] if p.split('=', 1)[0].lower() not in ('expires', 'max-age')]
+    return '; '.join(['%s=REDACTED' % (name,)] + attrs)
+
+def _scrub(headers):
+    scrubbed = []
+    for name, value in headers:
+        lower = name.lower()
+        if lower in _SKIPPED_HEADERS:
+            continue
+        if lower == 'set-cookie':
+            value = _scrub_cookie(value)
+        scrubbed.append((name, value))
+    return scrubbed
+
+def _encode_body(body):
+    try:
+        return {'text': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(body).decode('ascii')}
+
+def _decode_body(interaction):
+    if 'text' in interaction:
+        return interaction['text'].encode('utf-8')
+    return base64.b64decode(interaction['base64'])
+
+class Cassette():
+    """Records the responses of the intranet to a file, then replays them
+    without any network. Give it to :class:`Intra` with its ``cassette``
+    parameter.
+
+    The cassette is a gzip compressed file of JSON lines, one per response:
+    method, URL, status, headers, body and the time the response took.
+    Request headers and bodies are never recorded, so the credentials sent
+    at login do not end up in the file, and the values of the cookies set
+    by the server are replaced by ``REDACTED``.
+
+    When replaying, the responses recorded for the same method and URL are
+    served in the order they were recorded. A request without any recorded
+    response raises :class:`CassetteMiss`, nothing is ever sent, so a
+    replay can run in CI with no service behind it.
+
+    Parameters
+    ----------
+    path : str
+        The path of the cassette file.
+    mode : str
+        ``'record'`` to send the requests and record the responses,
+        ``'replay'`` to serve the recorded responses.
+    speed : Optional[float]
+        When replaying, ``None`` serves the responses at once, ``1.0``
+        waits as long as the original responses took, ``2.0`` half of it.
+    repeat : bool
+        When replaying, start over from the first response recorded for a
+        request once all of them were served, instead of raising
+        :class:`CassetteMiss`. Lets a short recording drive a long load
+        test.
+
+    Attributes
+    -----------
+    interactions: list
+        The recorded responses, as dicts.
+    played: int
+        The number of responses replayed.
+    """
+
+    RECORD = 'record'
+    REPLAY = 'replay'
+    VERSION = 1
+
+    def __init__(self, path, mode='replay', speed=None, repeat=True):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError('mode must be "record" or "replay", not %r' % (mode,))
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.repeat = repeat
+        self.interactions = []
+        self.played = 0
+        self._queues = {}
+        self._lock = threading.Lock()
+        if mode == self.REPLAY:
+            self.load()
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == self.RECORD:
+            self.save()
+
+    def load(self):
+        """Read the responses of the cassette file."""
+
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != self.VERSION:
+                raise ValueError('unsupported cassette version %r' % (header.get('version'),))
+            self.interactions = [json.loads(line) for line in f if line.strip()]
+        self._queues = {}
+        for interaction in self.interactions:
+            key = (interaction['method'], interaction['url'])
+            self._queues.setdefault(key, collections.deque()).append(interaction)
+
+    def save(self):
+        """Write the recorded responses to the cassette file."""
+
+        with self._lock:
+            interactions = list(self.interactions)
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'version': self.VERSION}) + '\n')
+            for interaction in interactions:
+                f.write(json.dumps(interaction, separators=(',', ':')) + '\n')
+
+    def record(self, method, url, status, reason, headers, body, elapsed):
+        """Append a response to the cassette. The headers are scrubbed."""
+
+        interaction = {
+            'method': method,
+            'url': url,
+            'status': status,
+            'reason': reason,
+            'headers': _scrub(headers),
+            'elapsed': round(elapsed, 6),
+        }
+        interaction.update(_encode_body(body))
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def play(self, method, url):
+        """Returns the next recorded response of a request.
+
+        Raises
+        ------
+        CassetteMiss
+            No response, or no more, was recorded for this request.
+        """
+
+        with self._lock:
+            queue = self._queues.get((method, url))
+            if not queue:
+                raise CassetteMiss('no recorded response for %s %s' % (method, url))
+            interaction = queue.popleft()
+            if self.repeat:
+                queue.append(interaction)
+            self.played += 1
+        return interaction
+
+    def bodies(self, pattern=None):
+        """Yield the decoded JSON bodies of the successful recorded
+        responses whose URL matches the regular expression ``pattern``,
+        to profile the parsing of the models apart from the network.
+        """
+
+        regex = re.compile(pattern) if pattern is not None else None
+        for interaction in self.interactions:
+            if interaction['status'] != 200 or 'text' not in interaction:
+                continue
+            if regex is not None and not regex.search(interaction['url']):
+                continue
+            try:
+                yield json.loads(interaction['text'])
+            except ValueError:
+                continue
+
+    def adapter(self, inner=None):
+        """Returns the :class:`CassetteAdapter` of this cassette. ``inner``
+        is the adapter sending the requests while recording.
+        """
+
+        return CassetteAdapter(self, inner)
+
+class CassetteAdapter(BaseAdapter):
+    """A :class:`requests.adapters.BaseAdapter` recording the responses
+    of ``inner`` to a :class:`Cassette`, or replaying them.
+    """
+
+    def __init__(self, cassette, inner=None):
+        super().__init__()
+        self.cassette = cassette
+        self.inner = inner if inner is not None else HTTPAdapter()
+
+    def _build(self, request, status, reason, headers, body):
+        headers = [(k, v) for k, v in headers if k.lower() not in _SKIPPED_HEADERS]
+        headers.append(('Content-Length', str(len(body))))
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=status,
+            reason=reason,
+            preload_content=False,
+            decode_content=False,
+            original_response=_Original(headers),
+            request_method=request.method,
+            request_url=request.url,
+        )
+        return self.inner.build_response(request, raw)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        cassette = self.cassette
+        if cassette.mode == Cassette.REPLAY:
+            interaction = cassette.play(request.method, request.url)
+            if cassette.speed:
+                time.sleep(interaction['elapsed'] / cassette.speed)
+            return self._build(request, interaction['status'], interaction['reason'],
+                               interaction['headers'], _decode_body(interaction))
+
+        start = time.monotonic()
+        res = self.inner.send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        try:
+            body = res.content
+        finally:
+            res.close()
+        elapsed = time.monotonic() - start
+        headers = [(name, value) for name in res.raw.headers for value in res.raw.headers.getlist(name)]
+        cassette.record(request.method, request.url, res.status_code, res.reason, headers, body, elapsed)
+        return self._build(request, res.status_code, res.reason, headers, body)
+
+    def close(self):
+        self.inner.close()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# The command-line interface, run with ``python -m etnapy``.
+#
+# Every command writes one JSON object per line on the standard output, so
+# the results can be piped to ``jq`` or loaded line by line. The logins are
+# queried ``--concurrency`` at a time and printed as they complete, with an
+# ``error`` key for the ones which failed; the exit status is ``1`` if any
+# did.
+#
+# The credentials are read from ``--username`` or ``ETNA_LOGIN`` and from
+# ``ETNA_PASSWORD``, or prompted. With ``--cache``, the users, promotions
+# and trophies stored by a previous run are answered from the SQLite file
+# without importing the HTTP client nor logging in. With ``--session``, the
+# session is saved to a file and reused by the next runs, which then need
+# no password until it expires; it is not ended on exit.
+
+import argparse
+import json
+import os
+import sys
+
+#: The commands answered from the :class:`SQLiteCache` records: the cached
+#: endpoint and the :class:`SQLiteCache` loader.
+_CACHED = {
+    'user': ('user_info', 'load_users'),
+    'promo': ('user_promo', 'load_promos'),
+    'trophies': ('user_trophy', 'load_trophies'),
+}
+
+def _raw(value):
+    if isinstance(value, list):
+        return [_raw(item) for item in value]
+    return getattr(value, '_raw', value)
+
+def _emit(record):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
+
+def _logins(args):
+    """Returns the logins of the command line, ``-`` reading them one per
+    line from the standard input.
+    """
+
+    logins = []
+    for login in args.logins:
+        if login == '-':
+            logins.extend(line.strip() for line in sys.stdin if line.strip())
+        else:
+            logins.append(login)
+    return list(dict.fromkeys(logins))
+
+def _open_cache(args):
+    if args.cache is None:
+        return None
+    from .store import SQLiteCache
+    return SQLiteCache(args.cache)
+
+def _connect(args, cache):
+    from .etnapy import Intra
+    from .session import SessionFile
+
+    base_urls = dict(item.split('=', 1) for item in args.base_url)
+    session_file = SessionFile(args.session) if args.session is not None else None
+    intra = Intra(cache=cache, pool_maxsize=max(10, args.concurrency), base_urls=base_urls,
+                  json_backend=args.json_backend, session_file=session_file)
+    username = args.username or os.environ.get('ETNA_LOGIN')
+    password = os.environ.get('ETNA_PASSWORD')
+    if not username:
+        raise SystemExit('etnapy: no username, use --username or ETNA_LOGIN')
+    if password is None and session_file is not None and intra.resume(username) is not None:
+        return intra
+    if password is None:
+        import getpass
+        password = getpass.getpass('Password for %s: ' % (username,))
+    if intra.login(username, password) is None:
+        raise SystemExit('etnapy: could not log in as %s' % (username,))
+    return intra
+
+def _query_logins(args, cache, intra_factory):
+    """Emit a record per login of ``args``, from the cache when fresh and
+    from the intranet otherwise. Returns the number of failed logins.
+    """
+
+    logins = _logins(args)
+    key = {'user': 'user', 'promo': 'promos', 'trophies': 'trophies'}[args.command]
+    failures = 0
+
+    if cache is not None:
+        endpoint, loader = _CACHED[args.command]
+        found = getattr(cache, loader)(logins, max_age=cache.ttl(endpoint))
+        for login in logins:
+            if login in found:
+                _emit({'login': login, key: _raw(found[login])})
+        logins = [login for login in logins if login not in found]
+        if not logins:
+            return 0
+
+    intra = intra_factory()
+    func = {'user': intra.user_info, 'promo': intra.user_promo, 'trophies': intra.user_trophy}[args.command]
+    for login, result in intra._iter_bulk(func, logins, args.concurrency):
+        if result is None or isinstance(result, Exception):
+            failures += 1
+            _emit({'login': login, 'error': str(result) if result is not None else 'not found'})
+        else:
+            _emit({'login': login, key: _raw(result)})
+    return failures
+
+def _query_avatars(args, intra):
+    os.makedirs(args.output, exist_ok=True)
+
+    def download(login):
+        f = intra.user_avatar(login)
+        if f is None:
+            return None
+        try:
+            path = os.path.join(args.output, '%s.jpg' % (login,))
+            with open(path, 'wb') as out:
+                size = out.write(f.read())
+            return path, size
+        finally:
+            f.close()
+
+    failures = 0
+    for login, result in intra._iter_bulk(download, _logins(args), args.concurrency):
+        if result is None or isinstance(result, Exception):
+            failures += 1
+            _emit({'login': login, 'error': str(result) if result is not None else 'not found'})
+        else:
+            _emit({'login': login, 'path': result[0], 'bytes': result[1]})
+    return failures
+
+def _query_walls(args, intra):
+    if not args.walls:
+        walls = intra.walls_list()
+        if walls is None:
+            _emit({'error': 'could not list the walls'})
+            return 1
+        for wall in walls:
+            _emit({'wall': wall})
+        return 0
+
+    from .wall import WallPageError
+
+    count = 0
+    failures = 0
+    for wall in args.walls:
+        try:
+            for conversation in intra.iter_wall(wall, args.page_size):
+                _emit(dict(conversation, wall=wall))
+                count += 1
+                if args.limit is not None and count >= args.limit:
+                    return failures
+        except WallPageError as e:
+            failures += 1
+            _emit({'wall': wall, 'error': str(e)})
+    return failures
+
+def build_parser():
+    """Returns the :class:`argparse.ArgumentParser` of the command line."""
+
+    parser = argparse.ArgumentParser(
+        prog='python -m etnapy',
+        description='Query the ETNA intranet and print the results as JSON lines.')
+    parser.add_argument('-u', '--username', help='the login to authenticate with (default: $ETNA_LOGIN)')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='requests in flight (default: 8)')
+    parser.add_argument('--cache', metavar='PATH', help='a SQLite cache answering the fresh queries')
+    parser.add_argument('--session', metavar='PATH', help='save the session to this file and reuse it')
+    parser.add_argument('--json-backend', default='json', help='json, orjson, ujson or auto')
+    parser.add_argument('--base-url', metavar='NAME=URL', action='append', default=[],
+                        help='override a host of the intranet (auth, intra or achievements)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    for name, description in (('user', 'information about users'), ('promo', 'promotions of users'),
+                       ('trophies', 'trophies of users'), ('avatar', 'download the avatars of users')):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('logins', nargs='+', help='the logins, "-" to read them from stdin')
+        if name == 'avatar':
+            command.add_argument('-o', '--output', default='.', help='the directory of the pictures')
+
+    command = commands.add_parser('walls', help='list the walls, or dump the conversations of some')
+    command.add_argument('walls', nargs='*', help='the walls to dump, none to list them')
+    command.add_argument('--page-size', type=int, default=50, help='conversations per request')
+    command.add_argument('--limit', type=int, help='stop after this number of conversations')
+    return parser
+
+def main(argv=None):
+    """Run the command line and returns the exit status."""
+
+    args = build_parser().parse_args(argv)
+    cache = _open_cache(args)
+    intra = None
+
+    def connect():
+        nonlocal intra
+        if intra is None:
+            intra = _connect(args, cache)
+        return intra
+
+    try:
+        if args.command in _CACHED:
+            failures = _query_logins(args, cache, connect)
+        elif args.command == 'avatar':
+            failures = _query_avatars(args, connect())
+        else:
+            failures = _query_walls(args, connect())
+    except BrokenPipeError:
+        # The reader went away, e.g. "| head".
+        sys.stderr.close()
+        return 1
+    finally:
+        if intra is not None and args.session is None:
+            intra.logout()
+        if cache is not None:
+            cache.close()
+    return 1 if failures else 0
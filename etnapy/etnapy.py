@@ -28,28 +28,406 @@ DEALINGS IN THE SOFTWARE.
 
 import requests
 import functools
+import threading
+import time
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from .user import User
-from .promo import Promo
 from .trophy import Trophy
+from .wall import WallPageError, page_conversations, page_total
+from .adapter import PoolingAdapter
+from .singleflight import SingleFlight
+from .jsonlib import get_loads, iter_array
+from .session import dump_cookies, load_cookies
+from .request import JsonRequest, build_promos, build_trophies, finish_json
 
 class Intra():
     """Represents the ETNA intranet. This class give
     functions for getting various information on the
     intranet.
 
+    An instance can be shared between threads: the authentication state is
+    guarded by a lock, so concurrent requests finding the session expired
+    trigger a single login. To spread the load over several sessions, see
+    :class:`IntraPool`.
+
+    Parameters
+    ----------
+    cache : Optional[:class:`ResponseCache` or :class:`SQLiteCache`]
+        The cache of the responses.
+    assets : Optional[:class:`AssetStore`]
+        The store of the avatars and trophy pictures.
+    limiter : Optional[:class:`RateLimiter`]
+        The rate limiter of the requests.
+    pool_maxsize : int or dict
+        The number of connections kept open per host, or a dict mapping
+        the host names to their number of connections.
+    pool_block : bool
+        If ``True``, wait for a free connection when all the connections to
+        a host are in use instead of opening one that will not be kept.
+    pool_warmup : int
+        The number of connections opened to each host right after the
+        login, so the first requests do not pay for the TLS handshakes.
+    pool_idle_timeout : Optional[float]
+        Close the connections to the hosts not used for this number of
+        seconds.
+    coalesce : bool
+        If ``True``, identical concurrent calls share a single request.
+    metrics : Optional[:class:`Metrics`]
+        The registry recording the metrics of the requests.
+    tracer : Optional[:class:`Tracer`]
+        The tracer receiving the timing of every request.
+    base_urls : Optional[dict]
+        Overrides of :attr:`BASE_URLS`, mapping ``'auth'``, ``'intra'`` or
+        ``'achievements'`` to the base URL of the service, to talk to a
+        mirror or a local stand-in of the intranet.
+    cassette : Optional[:class:`Cassette`]
+        Record the responses to this cassette, or replay them from it
+        without any network, depending on its mode.
+    json_backend : str
+        The library decoding the responses: ``'json'``, ``'orjson'``,
+        ``'ujson'`` or ``'auto'`` for the fastest one installed.
+    index : Optional[:class:`WallIndex`]
+        The full-text index to which the fetched wall conversations are
+        added.
+    session_file : Optional[:class:`SessionFile`]
+        The file sharing the session with the other processes of the
+        host: :func:`login` reuses the session saved there while it is
+        valid, and a renewed session is saved back.
+
     Attributes
     -----------
     etna_login: str
         The login of the user connected.
     is_logged: bool
         A boolean to know if an user is connected.
+    cache: Optional[:class:`ResponseCache` or :class:`SQLiteCache`]
+        The cache of the responses, ``None`` if disabled.
+    assets: Optional[:class:`AssetStore`]
+        The store of the avatars and trophy pictures, ``None`` if disabled.
+    limiter: Optional[:class:`RateLimiter`]
+        The rate limiter of the requests, ``None`` if disabled.
+    singleflight: Optional[:class:`SingleFlight`]
+        The tracker of the concurrent calls, counting the collapsed ones.
+        ``None`` if disabled.
+    metrics: Optional[:class:`Metrics`]
+        The registry of the metrics of the requests, ``None`` if disabled.
+    tracer: Optional[:class:`Tracer`]
+        The tracer of the requests, ``None`` if disabled.
+    cassette: Optional[:class:`Cassette`]
+        The cassette recording or replaying the responses, ``None`` if
+        disabled.
+    index: Optional[:class:`WallIndex`]
+        The full-text index of the wall conversations, ``None`` if
+        disabled.
+    session_file: Optional[:class:`SessionFile`]
+        The file sharing the session, ``None`` if disabled.
+    base_urls: dict
+        The base URLs of the services of the intranet.
+    wall_markers: dict
+        The ID of the newest conversation seen on each wall by
+        :func:`iter_wall_updates`.
+    expires_at: Optional[float]
+        The timestamp at which the session cookie expires, ``None`` if
+        unknown.
+    last_success: Optional[float]
+        The timestamp of the last successful request. Without a cookie
+        expiry, the session is believed stale :attr:`MAX_IDLE` seconds
+        after it.
     """
 
-    def __init__(self):
+    #: Seconds before the cookie expiry from which the session is renewed.
+    REFRESH_MARGIN = 60
+
+    #: Seconds without a successful request after which a session whose
+    #: cookie has no expiry is renewed.
+    MAX_IDLE = 3600
+
+    #: Seconds after a login during which a ``403`` is not considered as
+    #: an expired session but as a genuine permission error.
+    REAUTH_COOLDOWN = 30
+
+    #: The size of the chunks read by the streaming methods, in bytes.
+    STREAM_CHUNK_SIZE = 16384
+
+    #: The base URLs of the services of the intranet.
+    BASE_URLS = {
+        'auth': 'https://auth.etna-alternance.net',
+        'intra': 'https://intra-api.etna-alternance.net',
+        'achievements': 'https://achievements.etna-alternance.net',
+    }
+
+    def __init__(self, cache=None, assets=None, limiter=None, pool_maxsize=10, pool_block=False,
+                 pool_warmup=0, pool_idle_timeout=None, coalesce=True, metrics=None, tracer=None,
+                 base_urls=None, cassette=None, json_backend='json', index=None, session_file=None):
+        self.base_urls = dict(self.BASE_URLS, **(base_urls or {}))
+        self._loads = get_loads(json_backend)
+        self.wall_markers = {}
         self.session = requests.Session()
+        self.adapter = PoolingAdapter(pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.cassette = cassette
+        if cassette is not None:
+            transport = cassette.adapter(self.adapter)
+            self.session.mount('https://', transport)
+            self.session.mount('http://', transport)
+        self.pool_warmup = pool_warmup
+        self.pool_idle_timeout = pool_idle_timeout
+        self._reaped_at = time.monotonic()
         self.etna_login = ""
         self.is_logged = False
+        self.user = ""
+        self.pwd = ""
+        self.cache = cache
+        self.assets = assets
+        self.index = index
+        self.session_file = session_file
+        self._session_stamp = None
+        self.limiter = limiter
+        self.singleflight = SingleFlight() if coalesce else None
+        self.metrics = metrics
+        self.tracer = tracer
+        self.expires_at = None
+        self.last_success = None
+        self._logged_at = 0
+        self._auth_lock = threading.RLock()
+        self._auth_generation = 0
+
+    def _cookie_expiry(self):
+        expires = [c.expires for c in self.session.cookies if c.expires is not None]
+        return min(expires) if expires else None
+
+    def is_session_valid(self):
+        """Returns ``True`` if the session is believed to be valid, without
+        sending any request. The belief is based on the cookie expiry or,
+        when the cookie has none, on the time of the last successful
+        request. A session rejected by the server is detected on the next
+        request.
+        """
+
+        if not self.is_logged:
+            return False
+        if self.expires_at is not None:
+            return time.time() < self.expires_at - self.REFRESH_MARGIN
+        return self.last_success is not None and time.time() - self.last_success < self.MAX_IDLE
+
+    def check_session(self):
+        """Ask the intranet if the session is still valid. The session is
+        renewed if it is not.
+
+        Returns
+        -------
+        bool
+            ``True`` if the session is valid, possibly after a new login.
+        """
+
+        if not self.is_logged:
+            return False
+        res = self._send('GET', self.base_urls['auth'] + '/identity', 'check_session')
+        res.close()
+        return res.status_code == requests.codes.ok
+
+    def _relogin(self, generation):
+        """Log in again with the stored credentials, unless another caller
+        already did it since ``generation`` was read.
+        """
+
+        with self._auth_lock:
+            if generation != self._auth_generation or not self.user:
+                return
+            if self.session_file is not None:
+                data = self._shared_login(self.user, self.pwd, stale=self._session_stamp)
+            else:
+                data = self._authenticate(self.user, self.pwd)
+            if data is None:
+                self.etna_login = ""
+                self.is_logged = False
+
+    def warm_up(self, connections=1):
+        """Open connections to every host of the intranet in parallel, so
+        the next requests reuse them.
+
+        Parameters
+        ----------
+        connections : int
+            The number of connections opened per host.
+        """
+
+        def head(url):
+            try:
+                self.session.head(url).close()
+            except requests.RequestException:
+                pass
+
+        urls = [host + '/' for host in self.base_urls.values() for _ in range(connections)]
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            list(executor.map(head, urls))
+
+    def pool_stats(self):
+        """Returns a dict mapping each host to its connection statistics:
+        requests, connections established, reuse rate, waits for a free
+        connection and idle connections closed. See :class:`PoolStats`.
+        """
+
+        return self.adapter.stats()
+
+    def _request(self, method, url, endpoint=None, span=None, **kwargs):
+        """Send a request through the rate limiter, if any, and record it in
+        the metrics and the tracer, if any. ``endpoint`` is the name of the
+        calling method. The phases are added to ``span`` if given, else to
+        a new span emitted once the request is done.
+        """
+
+        if self.pool_idle_timeout is not None:
+            now = time.monotonic()
+            if now - self._reaped_at > self.pool_idle_timeout:
+                self._reaped_at = now
+                self.adapter.reap_idle(self.pool_idle_timeout)
+
+        limiter = self.limiter
+        metrics = self.metrics
+        tracer = self.tracer
+        if limiter is None and metrics is None and tracer is None:
+            return self.session.request(method, url, **kwargs)
+
+        own_span = tracer is not None and span is None
+        if own_span:
+            span = tracer.start(endpoint, method, url)
+        stream = kwargs.get('stream', False)
+        if span is not None:
+            # Read the body apart to time its download.
+            kwargs['stream'] = True
+            self.adapter.pop_connect_time()
+
+        host = urlsplit(url).hostname
+        if limiter is not None:
+            waited = limiter.acquire(host)
+            if span is not None:
+                span.add('queue', waited)
+
+        start = time.monotonic()
+        headers_at = None
+        try:
+            res = self.session.request(method, url, **kwargs)
+            headers_at = time.monotonic()
+            if span is not None and not stream:
+                res.content
+        except BaseException as e:
+            latency = time.monotonic() - start
+            if limiter is not None:
+                limiter.release(host, None, latency)
+            if metrics is not None:
+                metrics.record_request(endpoint, host, None, latency)
+            if span is not None:
+                span.error = repr(e)
+                self._trace_transfer(span, start, headers_at, stream)
+                if own_span:
+                    tracer.emit(span)
+            raise
+
+        latency = time.monotonic() - start
+        if limiter is not None:
+            limiter.release(host, res.status_code, latency, res.headers.get('Retry-After'))
+        if metrics is not None:
+            if stream:
+                nbytes = int(res.headers.get('Content-Length') or 0)
+            else:
+                nbytes = len(res.content)
+            metrics.record_request(endpoint, host, res.status_code, latency, nbytes)
+        if span is not None:
+            span.status = res.status_code
+            self._trace_transfer(span, start, headers_at, stream)
+            if own_span:
+                tracer.emit(span)
+        return res
+
+    def _trace_transfer(self, span, start, headers_at, stream):
+        now = time.monotonic()
+        connect = self.adapter.pop_connect_time()
+        if connect:
+            span.add('connect', connect)
+        if headers_at is None:
+            return
+        span.add('ttfb', headers_at - start - connect)
+        if not stream:
+            span.add('download', now - headers_at)
+
+    def _send(self, method, url, endpoint=None, span=None, **kwargs):
+        """Send a request. If the server answers ``401`` or ``403`` the
+        session is renewed and the request is sent once more.
+        """
+
+        generation = self._auth_generation
+        res = self._request(method, url, endpoint, span, **kwargs)
+
+        if res.status_code in (requests.codes.unauthorized, requests.codes.forbidden) and self.user:
+            if (res.status_code == requests.codes.unauthorized
+                    or time.monotonic() - self._logged_at > self.REAUTH_COOLDOWN):
+                res.close()
+                self._relogin(generation)
+                res = self._request(method, url, endpoint, span, **kwargs)
+
+        if res.status_code < 400:
+            self.last_success = time.time()
+        return res
+
+    def _get_stream(self, endpoint, url, headers):
+        return self._send('GET', url, endpoint, stream=True, headers=headers)
+
+    def _get_json(self, endpoint, url, login=None, build=None):
+        """Get the decoded json body of an URL, going through the cache if
+        the endpoint is cached, and give it to ``build`` if any. Returns
+        ``None`` if an error occured.
+        """
+
+        if self.singleflight is None:
+            data, span = self._fetch_json(endpoint, url, login)
+            return finish_json(self, endpoint, build, data, span)
+
+        leader = []
+
+        def fetch():
+            leader.append(True)
+            return self._fetch_json(endpoint, url, login)
+
+        data, span = self.singleflight.do(url, fetch)
+        return finish_json(self, endpoint, build, data, span, bool(leader))
+
+    def _fetch_json(self, endpoint, url, login):
+        """Returns the decoded json body of an URL, or ``None``, and the
+        :class:`Span` of the request if one was sent and traced.
+        """
+
+        request = JsonRequest(self, endpoint, url, login)
+        if request.lookup():
+            return request.entry.data, None
+        try:
+            res = self._send('GET', url, endpoint, request.span, headers=request.headers)
+        except BaseException:
+            request.failed()
+            raise
+
+        if request.revalidated(res.status_code):
+            return request.entry.data, request.span
+        if (res.status_code != requests.codes.ok):
+            return None, request.span
+        return request.decode(res.content, res.headers), request.span
+
+    def _iter_json(self, endpoint, url, key=None, build=None):
+        """Yield the items of the json array of an URL while its body is
+        downloaded, given to ``build`` if any. The cache is not used.
+        """
+
+        res = self._send('GET', url, endpoint, stream=True)
+        try:
+            if (res.status_code != requests.codes.ok):
+                return
+            for item in iter_array(res.iter_content(self.STREAM_CHUNK_SIZE), key):
+                yield build(item) if build is not None else item
+        finally:
+            res.close()
 
     def login(self, user, password):
         """Establish a connection with the intranet.
@@ -69,49 +447,141 @@ class Intra():
             Returns ``None`` if the connection failed.
         """
 
-        if self.is_logged:
-            return None
+        with self._auth_lock:
+            if self.is_logged:
+                return None
+
+            if self.session_file is not None:
+                return self._shared_login(user, password)
+            return self._authenticate(user, password)
+
+    def resume(self, user):
+        """Adopt the session of ``user`` saved in :attr:`session_file` by
+        another process, without credentials. The session cannot be
+        renewed by this instance but a session renewed by another process
+        is adopted when it expires.
 
+        Returns
+        -------
+        dict or ``None``
+            The json dict returned by the login which created the session.
+            ``None`` if there is no valid session saved.
+        """
+
+        with self._auth_lock:
+            if self.is_logged or self.session_file is None:
+                return None
+            return self._shared_login(user, None)
+
+    def _adopt(self, session, user, password, stale):
+        """Take over a saved session if it is valid, is not the one known
+        as rejected, ``stale``, and was created with ``password``. Without
+        a password (see :func:`resume`) the session is taken over but no
+        password is stored to renew it.
+        """
+
+        if session is None or session.get('saved_at') == stale:
+            return False
+        expires_at = session.get('expires_at')
+        if expires_at is not None and time.time() >= expires_at - self.REFRESH_MARGIN:
+            return False
+        if password and not self.session_file.check_password(session, password):
+            return False
+
+        self.session.cookies.clear()
+        load_cookies(self.session.cookies, session['cookies'])
+        self.is_logged = True
+        self.user = user
+        if password:
+            self.pwd = password
+        self.etna_login = session['etna_login']
+        self.expires_at = expires_at
+        # The session was last known to work when it was saved.
+        self.last_success = session['saved_at']
+        self._session_stamp = session['saved_at']
+        self._logged_at = time.monotonic()
+        self._auth_generation += 1
+        return True
+
+    def _shared_login(self, user, password, stale=None):
+        """Log in through :attr:`session_file`: adopt the saved session,
+        else renew it under the file lock unless another process did it
+        while we waited.
+        """
+
+        key = self.session_file.key(self.base_urls['auth'], user)
+        session = self.session_file.load(key)
+        if self._adopt(session, user, password, stale):
+            return session['identity']
+
+        with self.session_file.lock():
+            session = self.session_file.load(key)
+            if self._adopt(session, user, password, stale):
+                return session['identity']
+            if not password:
+                return None
+            data = self._authenticate(user, password)
+            if data is None:
+                return None
+            self._session_stamp = time.time()
+            session = {
+                'etna_login': self.etna_login,
+                'expires_at': self.expires_at,
+                'saved_at': self._session_stamp,
+                'identity': data,
+                'cookies': dump_cookies(self.session.cookies),
+            }
+            session.update(self.session_file.hash_password(password))
+            self.session_file.save(key, session)
+            return data
+
+    def _authenticate(self, user, password):
         payload = {'login': user, 'password': password}
-        res = self.session.post('https://auth.etna-alternance.net/identity', data=payload)
+        res = self._request('POST', self.base_urls['auth'] + '/identity', 'login', data=payload)
         res.encoding = 'utf-8'
 
         if (res.status_code == requests.codes.ok):
+            data = self._loads(res.content)
             self.is_logged = True
             self.user = user
             self.pwd = password
-            self.etna_login = res.json()["login"]
-            return res.json()
+            self.etna_login = data["login"]
+            self.expires_at = self._cookie_expiry()
+            self.last_success = time.time()
+            self._logged_at = time.monotonic()
+            self._auth_generation += 1
+            if self.pool_warmup:
+                self.warm_up(self.pool_warmup)
+            return data
         else:
             return None
 
     def keep_alive(self, func):
         """A simple decorator to make sure you're always connected.
+
+        No request is sent to check the session: it is renewed only when
+        the cookie is about to expire, or when no request succeeded for
+        :attr:`MAX_IDLE` seconds if the cookie has no expiry. A session
+        rejected by the server is renewed by the request itself, which is
+        then replayed.
         """
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            res = self.session.get('https://auth.etna-alternance.net/identity')
-
-            if res.status_code != requests.codes.ok:
-                self.etna_login = ""
-                self.is_logged = False
-                self.login(self.user, self.pwd)
+            if not self.is_session_valid():
+                self._relogin(self._auth_generation)
             return func(*args, **kwargs)
         return wrapper
 
     def keep_alive_async(self, func):
         """A simple decorator to make sure you're always connected.
         This one accept and only accept asynchronous coroutines.
+        See :func:`keep_alive`.
         """
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            res = self.session.get('https://auth.etna-alternance.net/identity')
-
-            if res.status_code != requests.codes.ok:
-                self.etna_login = ""
-                self.is_logged = False
-                self.login(self.user, self.pwd)
+            if not self.is_session_valid():
+                self._relogin(self._auth_generation)
             return await func(*args, **kwargs)
         return wrapper
 
@@ -137,13 +607,8 @@ class Intra():
         if user_login is None:
             user_login = self.etna_login
 
-        res = self.session.get('https://auth.etna-alternance.net/api/users/%s' % (user_login,))
-        res.encoding = 'utf-8'
-
-        if (res.status_code == requests.codes.ok):
-            return User(res.json())
-        else:
-            return None
+        url = '%s/api/users/%s' % (self.base_urls['auth'], user_login)
+        return self._get_json('user_info', url, user_login, functools.partial(User, client=self))
 
     def user_avatar(self, user_login=None):
         """Get the raw bytes of the user avatar.
@@ -153,6 +618,12 @@ class Intra():
         user_login : Optionnal[str]
             The user login. If no login provided the current connected
             user will be used.
+
+        Returns
+        -------
+        file object or ``None``
+            A readable binary stream of the avatar, a file of the
+            :attr:`assets` store if enabled. ``None`` if an error occured.
         """
 
         if not self.is_logged:
@@ -161,8 +632,11 @@ class Intra():
         if user_login is None:
             user_login = self.etna_login
 
-        url = 'https://auth.etna-alternance.net/api/users/%s/photo' % (user_login,)
-        res = self.session.get(url, stream=True)
+        url = '%s/api/users/%s/photo' % (self.base_urls['auth'], user_login)
+        if self.assets is not None:
+            return self.assets.open('avatar/%s' % (user_login,), url, functools.partial(self._get_stream, 'user_avatar'))
+
+        res = self._send('GET', url, 'user_avatar', stream=True)
         res.encoding = 'utf-8'
 
         if (res.status_code == requests.codes.ok):
@@ -192,13 +666,8 @@ class Intra():
         if user_login is None:
             user_login = self.etna_login
 
-        res = self.session.get('https://intra-api.etna-alternance.net/promo?login=%s' % (user_login,))
-        res.encoding = 'utf-8'
-
-        if (res.status_code == requests.codes.ok):
-            return [Promo(x) for x in res.json()]
-        else:
-            return None
+        url = '%s/promo?login=%s' % (self.base_urls['intra'], user_login)
+        return self._get_json('user_promo', url, user_login, functools.partial(build_promos, client=self))
 
     def walls_list(self):
         """Get all the connected user's walls.
@@ -212,13 +681,7 @@ class Intra():
         if not self.is_logged:
             return None
 
-        res = self.session.get('https://intra-api.etna-alternance.net/walls')
-        res.encoding = 'utf-8'
-
-        if (res.status_code == requests.codes.ok):
-            return res.json()
-        else:
-            return None
+        return self._get_json('walls_list', self.base_urls['intra'] + '/walls')
 
     def wall_messages(self, wall_name, start, stop):
         """Get wall's messages.
@@ -241,14 +704,133 @@ class Intra():
         if not self.is_logged:
             return None
 
-        url = 'https://intra-api.etna-alternance.net/walls/%s/conversations?from=%d&size=%d' % (wall_name, start, stop)
-        res = self.session.get(url)
-        res.encoding = 'utf-8'
+        url = '%s/walls/%s/conversations?from=%d&size=%d' % (self.base_urls['intra'], wall_name, start, stop)
+        page = self._get_json('wall_messages', url)
+        if page is not None and self.index is not None:
+            self.index.add(wall_name, page)
+        return page
 
-        if (res.status_code == requests.codes.ok):
-            return res.json()
-        else:
-            return None
+    def iter_wall_messages(self, wall_name, start, stop):
+        """Iterate over the conversations of a page of a wall while it is
+        downloaded, without decoding the whole page at once. Unlike
+        :func:`wall_messages` the cache is not used.
+
+        Parameters
+        ----------
+        wall_name : str
+            The name of the wall.
+        start: int
+            The start index of the messages. Start from 0.
+        stop: int
+            The stop index of the messages.
+
+        Yields
+        ------
+        dict
+            The json object of each conversation.
+        """
+
+        if not self.is_logged:
+            return
+
+        url = '%s/walls/%s/conversations?from=%d&size=%d' % (self.base_urls['intra'], wall_name, start, stop)
+        if self.index is None:
+            yield from self._iter_json('wall_messages', url, 'hits')
+            return
+
+        batch = []
+        try:
+            for conversation in self._iter_json('wall_messages', url, 'hits'):
+                batch.append(conversation)
+                if len(batch) >= 100:
+                    self.index.add(wall_name, batch)
+                    batch = []
+                yield conversation
+        finally:
+            self.index.add(wall_name, batch)
+
+    def iter_wall(self, wall_name, page_size=20, until=None):
+        """Iterate over the conversations of a wall, from the newest. The
+        next page is fetched in background while the current one is
+        consumed, so at most two pages are held in memory.
+
+        Parameters
+        ----------
+        wall_name : str
+            The name of the wall.
+        page_size: int
+            The number of conversations fetched per request.
+        until: Optional[int]
+            Stop before the conversation having this ID.
+
+        Yields
+        ------
+        dict
+            The json object of each conversation.
+
+        Raises
+        ------
+        :class:`WallPageError`
+            A page could not be fetched.
+        """
+
+        start = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.wall_messages, wall_name, start, page_size)
+            try:
+                while future is not None:
+                    page = future.result()
+                    if page is None:
+                        future = None
+                        raise WallPageError(wall_name, start)
+                    conversations = page_conversations(page)
+                    start += len(conversations)
+                    total = page_total(page)
+
+                    future = None
+                    if len(conversations) == page_size and (total is None or start < total):
+                        future = executor.submit(self.wall_messages, wall_name, start, page_size)
+
+                    for conversation in conversations:
+                        if until is not None and conversation.get('id') == until:
+                            return
+                        yield conversation
+            finally:
+                if future is not None:
+                    future.cancel()
+
+    def iter_wall_updates(self, wall_name, page_size=20):
+        """Iterate over the conversations of a wall posted since the last
+        call for this wall, from the newest. The ID of the newest
+        conversation is kept in :attr:`wall_markers` and the iteration stops
+        when reaching the previous one, so polling a quiet wall costs a
+        single request. The first call yields the whole wall.
+
+        The marker only moves once the previous one or the end of the wall
+        is reached: if a page fails (:class:`WallPageError`) or the loop
+        is left early, the next call yields the same conversations again
+        rather than skipping some.
+
+        Parameters
+        ----------
+        wall_name : str
+            The name of the wall.
+        page_size: int
+            The number of conversations fetched per request.
+
+        Yields
+        ------
+        dict
+            The json object of each new conversation.
+        """
+
+        newest = None
+        for conversation in self.iter_wall(wall_name, page_size, self.wall_markers.get(wall_name)):
+            if newest is None:
+                newest = conversation.get('id')
+            yield conversation
+        if newest is not None:
+            self.wall_markers[wall_name] = newest
 
     def user_trophy(self, user_login=None):
         """Get user's trophy.
@@ -271,13 +853,34 @@ class Intra():
         if user_login is None:
             user_login = self.etna_login
 
-        res = self.session.get('https://achievements.etna-alternance.net/api/users/%s/achievements' % (user_login,))
-        res.encoding = 'utf-8'
+        url = '%s/api/users/%s/achievements' % (self.base_urls['achievements'], user_login)
+        return self._get_json('user_trophy', url, user_login, functools.partial(build_trophies, client=self))
 
-        if (res.status_code == requests.codes.ok):
-            return [Trophy(x) for x in res.json()]
-        else:
-            return None
+    def iter_user_trophy(self, user_login=None):
+        """Iterate over the trophies of an user while the list is
+        downloaded, without decoding it at once. Unlike :func:`user_trophy`
+        the cache is not used.
+
+        Parameters
+        ----------
+        user_login : Optionnal[str]
+            The user login. If no login provided the current connected
+            user will be used.
+
+        Yields
+        ------
+        :class:`Trophy`
+            The trophies of the user.
+        """
+
+        if not self.is_logged:
+            return
+
+        if user_login is None:
+            user_login = self.etna_login
+
+        url = '%s/api/users/%s/achievements' % (self.base_urls['achievements'], user_login)
+        yield from self._iter_json('user_trophy', url, build=functools.partial(Trophy, client=self))
 
     def trophy_picture(self, id_trophy):
         """Get a tuple with the URL of the trophy avatar and the raw
@@ -292,8 +895,12 @@ class Intra():
         if not self.is_logged:
             return None, None
 
-        url = 'https://achievements.etna-alternance.net/api/achievements/%d.png' % (id_trophy,)
-        res = self.session.get(url, stream=True)
+        url = '%s/api/achievements/%d.png' % (self.base_urls['achievements'], id_trophy)
+        if self.assets is not None:
+            f = self.assets.open('trophy/%d' % (id_trophy,), url, functools.partial(self._get_stream, 'trophy_picture'))
+            return (url, f) if f is not None else (None, None)
+
+        res = self._send('GET', url, 'trophy_picture', stream=True)
         res.encoding = 'utf-8'
 
         if (res.status_code == requests.codes.ok):
@@ -301,14 +908,214 @@ class Intra():
         else:
             return None, None
 
+    def _iter_bulk(self, func, logins, max_workers):
+        """Run ``func`` for every login on a bounded pool of threads and
+        yield ``(login, result)`` tuples as soon as they complete. At most
+        ``max_workers`` calls are in flight, so the iterable of logins is
+        consumed lazily. An exception raised by ``func`` is yielded as the
+        result of its login instead of being propagated.
+        """
+
+        logins = iter(logins)
+        seen = set()
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit_next():
+                for login in logins:
+                    if login in seen:
+                        continue
+                    seen.add(login)
+                    pending[executor.submit(func, login)] = login
+                    return True
+                return False
+
+            for _ in range(max_workers):
+                if not submit_next():
+                    break
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    login = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    submit_next()
+                    yield login, result
+
+    def iter_users_info(self, logins, max_workers=8):
+        """Get information about many users concurrently.
+
+        Parameters
+        ----------
+        logins : iterable of str
+            The users logins. Duplicates are fetched only once.
+        max_workers : int
+            The maximum number of requests in flight.
+
+        Yields
+        ------
+        tuple of (str, :class:`User` or ``None`` or :class:`Exception`)
+            The login and its result, in order of completion.
+        """
+
+        return self._iter_bulk(self.user_info, logins, max_workers)
+
+    def users_info(self, logins, max_workers=8):
+        """Get information about many users concurrently.
+
+        Parameters
+        ----------
+        logins : iterable of str
+            The users logins.
+        max_workers : int
+            The maximum number of requests in flight.
+
+        Returns
+        -------
+        dict
+            A dict mapping each login to its :class:`User`, ``None`` if the
+            intranet returned an error or the :class:`Exception` raised while
+            fetching it.
+        """
+
+        return dict(self.iter_users_info(logins, max_workers))
+
+    def iter_users_promo(self, logins, max_workers=8):
+        """Get the promotions of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+
+        Yields
+        ------
+        tuple of (str, list of :class:`Promo` or ``None`` or :class:`Exception`)
+            The login and its result, in order of completion.
+        """
+
+        return self._iter_bulk(self.user_promo, logins, max_workers)
+
+    def users_promo(self, logins, max_workers=8):
+        """Get the promotions of many users concurrently.
+        See :func:`users_info` for the parameters.
+
+        Returns
+        -------
+        dict
+            A dict mapping each login to its list of :class:`Promo`, ``None``
+            or the :class:`Exception` raised while fetching it.
+        """
+
+        return dict(self.iter_users_promo(logins, max_workers))
+
+    def iter_users_trophies(self, logins, max_workers=8):
+        """Get the trophies of many users concurrently.
+        See :func:`iter_users_info` for the parameters.
+
+        Yields
+        ------
+        tuple of (str, list of :class:`Trophy` or ``None`` or :class:`Exception`)
+            The login and its result, in order of completion.
+        """
+
+        return self._iter_bulk(self.user_trophy, logins, max_workers)
+
+    def users_trophies(self, logins, max_workers=8):
+        """Get the trophies of many users concurrently.
+        See :func:`users_info` for the parameters.
+
+        Returns
+        -------
+        dict
+            A dict mapping each login to its list of :class:`Trophy`, ``None``
+            or the :class:`Exception` raised while fetching it.
+        """
+
+        return dict(self.iter_users_trophies(logins, max_workers))
+
+    def _load(self, loader, key):
+        """Load the value of a :class:`~etnapy.utils.relation` of a model."""
+
+        if loader == 'trophy_picture':
+            f = self.trophy_picture(key)[1]
+            if f is None:
+                return None
+            try:
+                return f.read()
+            finally:
+                f.close()
+        return getattr(self, loader)(key)
+
+    def prefetch(self, models, name, max_workers=8):
+        """Load a relation of many models at once, on a pool of threads,
+        instead of one request after another on first access. The models
+        sharing a key share a single request.
+
+        Parameters
+        ----------
+        models : iterable of :class:`User` or :class:`Trophy`
+            The models built by this client.
+        name : str
+            The relation to load: ``'trophies'`` or ``'promos'`` of users,
+            ``'picture'`` of trophies.
+        max_workers : int
+            The maximum number of requests in flight.
+
+        Returns
+        -------
+        list
+            The models.
+
+        Example
+        -------
+        >>> users = [u for u in intra.users_info(logins).values() if isinstance(u, User)]
+        >>> for user in intra.prefetch(users, 'trophies'):
+        ...     print(user.login, len(user.trophies or []))
+        """
+
+        models = list(models)
+        pending = {}
+        for model in models:
+            descriptor = getattr(type(model), name)
+            try:
+                getattr(model, descriptor.slot)
+            except AttributeError:
+                pending.setdefault(getattr(model, descriptor.key), []).append(model)
+        if not pending:
+            return models
+
+        def load(key):
+            return self._load(descriptor.loader, key)
+
+        for key, value in self._iter_bulk(load, pending, max_workers):
+            if value is None or isinstance(value, Exception):
+                continue
+            for model in pending[key]:
+                setattr(model, name, value)
+        return models
+
     def logout(self):
         """Log out from the intranet.
+
+        The session saved in :attr:`session_file` is removed as well, the
+        other processes sharing it will log in again. To stop using a
+        shared session without ending it, just drop the instance.
         """
 
-        if not self.is_logged:
-            return
-        self.session.delete('https://auth.etna-alternance.net/identity')
-        self.is_logged = False
-        self.etna_login = ""
-        self.user = ""
-        self.pwd = ""
+        with self._auth_lock:
+            if not self.is_logged:
+                return
+            self._request('DELETE', self.base_urls['auth'] + '/identity', 'logout')
+            if self.assets is not None:
+                self.assets.flush()
+            if self.session_file is not None and self._session_stamp is not None:
+                self.session_file.remove(self.session_file.key(self.base_urls['auth'], self.user),
+                                         self._session_stamp)
+                self._session_stamp = None
+            self.is_logged = False
+            self.etna_login = ""
+            self.user = ""
+            self.pwd = ""
+            self.expires_at = None
+            self.last_success = None
+            self._auth_generation += 1
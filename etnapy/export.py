@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import csv
+import glob
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+from .wall import page_conversations, page_total
+
+#: The columns written by :class:`CSVWriter` and :class:`ParquetWriter` for
+#: each kind of export.
+DEFAULT_FIELDS = {
+    'users': ('login', 'id', 'firstname', 'lastname', 'email', 'close', 'roles',
+              'created_at', 'updated_at', 'deleted_at'),
+    'promos': ('login', 'id', 'target_name', 'term_name', 'learning_start', 'learning_end',
+               'learning_duration', 'promo', 'spe', 'wall_name'),
+    'trophies': ('login', 'id', 'name', 'description', 'type', 'achieved_at'),
+    'walls': ('wall', 'id', 'title', 'created_at', 'user', 'messages'),
+}
+
+def _flat(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+class NDJSONWriter():
+    """Writes the records as JSON lines.
+
+    Parameters
+    ----------
+    path : str
+        The path of the output file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fields = None
+        self._f = None
+
+    def open(self, position=0):
+        """Open the output, truncated to ``position`` bytes to resume an
+        export, or emptied.
+        """
+
+        if position and os.path.exists(self.path):
+            self._f = open(self.path, 'r+b')
+            self._f.truncate(position)
+            self._f.seek(position)
+        else:
+            self._f = open(self.path, 'wb')
+
+    def write(self, record):
+        self._f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    def flush(self):
+        """Flush the output to the disk and returns its position."""
+
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+class CSVWriter(NDJSONWriter):
+    """Writes the records as CSV rows. The nested values are written as
+    JSON.
+
+    Parameters
+    ----------
+    path : str
+        The path of the output file.
+    fields : Optional[list of str]
+        The columns, by default the ones of :data:`DEFAULT_FIELDS` for the
+        kind of export.
+    """
+
+    def __init__(self, path, fields=None):
+        super().__init__(path)
+        self.fields = fields
+        self._csv = None
+
+    def open(self, position=0):
+        resume = position and os.path.exists(self.path)
+        super().open(position)
+        self._csv = csv.writer(self)
+        if not resume:
+            self._csv.writerow(self.fields)
+
+    def write(self, record):
+        if isinstance(record, str):
+            # Called back by the csv module with a formatted row.
+            self._f.write(record.encode('utf-8'))
+            return
+        self._csv.writerow([_flat(record.get(field)) for field in self.fields])
+
+class ParquetWriter():
+    """Writes the records as Parquet files, one per checkpoint, in a
+    directory. Requires pyarrow.
+
+    Parameters
+    ----------
+    path : str
+        The path of the output directory.
+    fields : Optional[list of str]
+        The columns, by default the ones of :data:`DEFAULT_FIELDS` for the
+        kind of export.
+    """
+
+    def __init__(self, path, fields=None):
+        if pyarrow is None:
+            raise RuntimeError('ParquetWriter requires pyarrow, install it with "pip install pyarrow"')
+        self.path = path
+        self.fields = fields
+        self._rows = []
+        self._parts = 0
+
+    def _part(self, number):
+        return os.path.join(self.path, 'part-%05d.parquet' % (number,))
+
+    def open(self, position=0):
+        """Open the output, keeping the first ``position`` parts to resume
+        an export.
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+        for name in glob.glob(os.path.join(self.path, 'part-*.parquet')):
+            if int(os.path.basename(name)[5:10]) >= position:
+                os.remove(name)
+        self._parts = position
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append(record)
+
+    def flush(self):
+        """Write the records received since the last call as a new part and
+        returns the number of parts.
+        """
+
+        if self._rows:
+            columns = {field: [_flat(row.get(field)) for row in self._rows] for field in self.fields}
+            pyarrow.parquet.write_table(pyarrow.table(columns), self._part(self._parts))
+            self._parts += 1
+            self._rows = []
+        return self._parts
+
+    def close(self):
+        self._rows = []
+
+class ExportStats():
+    """The progress of an export.
+
+    Attributes
+    -----------
+    kind: str
+        The kind of export.
+    records: int
+        The number of records written by this run.
+    keys: int
+        The number of logins or walls completed, including the ones of the
+        runs resumed.
+    errors: int
+        The number of logins or walls whose fetch failed.
+    position: int
+        The size of the output, in bytes or parts.
+    elapsed: float
+        The duration of the run, in seconds.
+    """
+
+    __slots__ = ('kind', 'records', 'keys', 'errors', 'position', 'elapsed')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.records = 0
+        self.keys = 0
+        self.errors = 0
+        self.position = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """The number of records written per second."""
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return '<ExportStats kind=%s records=%d keys=%d errors=%d rate=%.1f/s>' % (
+            self.kind, self.records, self.keys, self.errors, self.rate)
+
+class Exporter():
+    """Streams data of the intranet to a file.
+
+    The records are written as they are received, so the memory used does
+    not depend on the size of the export: at most ``max_workers`` requests
+    are in flight and no new one is sent until a result is written.
+
+    With a ``checkpoint`` file, the logins or walls completed and the size
+    of the output are saved every ``checkpoint_every`` records. Running the
+    same export again after an interruption truncates the output to the
+    last checkpoint and resumes from there. The checkpoint of a completed
+    export is removed.
+
+    Parameters
+    ----------
+    intra : :class:`Intra`
+        A logged client.
+    writer : :class:`NDJSONWriter`, :class:`CSVWriter` or :class:`ParquetWriter`
+        The output.
+    checkpoint : Optional[str]
+        The path of the checkpoint file.
+    max_workers : int
+        The maximum number of requests in flight.
+    checkpoint_every : int
+        The number of records between two checkpoints.
+    progress : Optional[callable]
+        Called with the :class:`ExportStats` every ``progress_interval``
+        seconds and at the end.
+    progress_interval : float
+        The delay between two calls of ``progress``, in seconds.
+
+    Example
+    -------
+    >>> exporter = Exporter(intra, CSVWriter('trophies.csv'), checkpoint='trophies.ckpt', progress=print)
+    >>> exporter.trophies(logins)
+    <ExportStats kind=trophies records=48211 keys=1650 errors=0 rate=912.4/s>
+    """
+
+    def __init__(self, intra, writer, checkpoint=None, max_workers=8, checkpoint_every=500,
+                 progress=None, progress_interval=5.0):
+        self.intra = intra
+        self.writer = writer
+        self.checkpoint = checkpoint
+        self.max_workers = max_workers
+        self.checkpoint_every = checkpoint_every
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._state = None
+        self._stats = None
+
+    def _start(self, kind):
+        state = None
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+            if state.get('kind') != kind:
+                state = None
+        if state is None:
+            state = {'kind': kind, 'position': 0, 'done': [], 'walls': {}}
+        self._state = state
+        self._done = set(state['done'])
+        self._stats = ExportStats(kind)
+        self._stats.keys = len(self._done)
+        self._started = time.monotonic()
+        self._reported = self._started
+        self._since_checkpoint = 0
+        if self.writer.fields is None:
+            self.writer.fields = DEFAULT_FIELDS[kind]
+        self.writer.open(state['position'])
+
+    def _save(self):
+        self._state['position'] = self._stats.position = self.writer.flush()
+        self._state['done'] = list(self._done)
+        if self.checkpoint is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.checkpoint)
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        self._stats.elapsed = now - self._started
+        if self.progress is not None and (force or now - self._reported >= self.progress_interval):
+            self._reported = now
+            self.progress(self._stats)
+
+    def _write(self, records):
+        for record in records:
+            self.writer.write(record)
+            self._stats.records += 1
+            self._since_checkpoint += 1
+
+    def _completed(self, key):
+        self._done.add(key)
+        self._stats.keys += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._since_checkpoint = 0
+            self._save()
+        self._report()
+
+    def _finish(self):
+        self._stats.position = self.writer.flush()
+        self.writer.close()
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self._report(force=True)
+        return self._stats
+
+    def _export_logins(self, kind, func, records, logins):
+        self._start(kind)
+        try:
+            pending = (login for login in logins if login not in self._done)
+            for login, result in self.intra._iter_bulk(func, pending, self.max_workers):
+                if result is None or isinstance(result, Exception):
+                    self._stats.errors += 1
+                    continue
+                self._write(records(login, result))
+                self._completed(login)
+        except BaseException:
+            self._save()
+            self.writer.close()
+            raise
+        return self._finish()
+
+    def users(self, logins):
+        """Export the information of users, one record per user.
+
+        Returns
+        -------
+        :class:`ExportStats`
+            The statistics of the run.
+        """
+
+        return self._export_logins('users', self.intra.user_info, lambda login, user: [user._raw], logins)
+
+    def promos(self, logins):
+        """Export the promotions of users, one record per promotion with
+        the ``login`` of the user. See :func:`users`.
+        """
+
+        def records(login, promos):
+            return [dict(promo._raw, login=login) for promo in promos]
+
+        return self._export_logins('promos', self.intra.user_promo, records, logins)
+
+    def trophies(self, logins):
+        """Export the trophies of users, one record per trophy with the
+        ``login`` of the user. See :func:`users`.
+        """
+
+        def records(login, trophies):
+            for trophy in trophies:
+                record = dict(trophy._raw, login=login)
+                if isinstance(record.get('achieved_at'), list):
+                    record['achieved_at'] = record['achieved_at'][0] if record['achieved_at'] else None
+                yield record
+
+        return self._export_logins('trophies', self.intra.user_trophy, records, logins)
+
+    def walls(self, walls=None, page_size=100):
+        """Export the conversations of walls, one record per conversation
+        with the name of its ``wall``. The pages of a wall are fetched
+        ``max_workers`` at a time and written in order.
+
+        Parameters
+        ----------
+        walls : Optional[list of str]
+            The walls, by default every wall of :func:`Intra.walls_list`.
+        page_size : int
+            The number of conversations fetched per request.
+
+        Returns
+        -------
+        :class:`ExportStats`
+            The statistics of the run.
+        """
+
+        self._start('walls')
+        try:
+            if walls is None:
+                walls = self.intra.walls_list() or []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for wall in walls:
+                    if wall not in self._done:
+                        self._export_wall(executor, wall, page_size)
+        except BaseException:
+            self._save()
+            self.writer.close()
+            raise
+        return self._finish()
+
+    def _export_wall(self, executor, wall, page_size):
+        progress = self._state['walls']
+        start = progress.get(wall, 0)
+        total = None
+        window = []
+        while True:
+            # Keep up to max_workers pages in flight, written in order.
+            while len(window) < self.max_workers and (total is None and not window or
+                                                      total is not None and start < total):
+                window.append((start, executor.submit(self.intra.wall_messages, wall, start, page_size)))
+                start += page_size
+            if not window:
+                break
+            offset, future = window.pop(0)
+            page = future.result()
+            if page is None:
+                self._stats.errors += 1
+                for _, other in window:
+                    other.cancel()
+                return
+            conversations = page_conversations(page)
+            total = page_total(page)
+            if total is None:
+                total = offset + len(conversations) + (1 if len(conversations) == page_size else 0)
+            self._write(dict(conversation, wall=wall) for conversation in conversations)
+            progress[wall] = offset + len(conversations)
+            if len(conversations) < page_size:
+                for _, other in window:
+                    other.cancel()
+                break
+            if self._since_checkpoint >= self.checkpoint_every:
+                self._since_checkpoint = 0
+                self._save()
+            self._report()
+        progress.pop(wall, None)
+        self._completed(wall)
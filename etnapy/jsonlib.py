@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+#: The JSON backends known, from the fastest.
+BACKENDS = ('orjson', 'ujson', 'json')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITERS = frozenset(' \t\n\r,:]}')
+_decoder = json.JSONDecoder()
+
+def get_loads(backend='json'):
+    """Returns the function decoding a JSON document, given as bytes, with
+    the given backend.
+
+    Parameters
+    ----------
+    backend : str
+        ``'json'`` for the standard library, ``'orjson'`` or ``'ujson'``
+        for these packages, or ``'auto'`` for the fastest one installed.
+
+    Raises
+    ------
+    ValueError
+        The backend is unknown or not installed.
+    """
+
+    if backend == 'auto':
+        backend = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+    if backend == 'json':
+        return json.loads
+    if backend == 'orjson':
+        if orjson is None:
+            raise ValueError('the orjson backend requires orjson, install it with "pip install orjson"')
+        return orjson.loads
+    if backend == 'ujson':
+        if ujson is None:
+            raise ValueError('the ujson backend requires ujson, install it with "pip install ujson"')
+        return ujson.loads
+    raise ValueError('unknown JSON backend %r, expected one of %s or auto' % (backend, ', '.join(BACKENDS)))
+
+class _Reader():
+    """A text buffer filled from an iterable of byte chunks on demand."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Append the next chunk to the buffer. Returns ``False`` at the
+        end of the stream.
+        """
+
+        if self.eof:
+            return False
+        if self.pos > 65536 and self.pos * 2 > len(self.buffer):
+            # Drop what was consumed so the buffer does not grow with the body.
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self.decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self):
+        """Skip the whitespaces and return the next character, ``''`` at
+        the end of the stream.
+        """
+
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if c == '' or c not in chars:
+            raise ValueError('expected %r at offset %d, found %r' % (chars, self.pos, c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode the JSON value at the current position."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+            # A number cut by the end of a chunk decodes as a shorter one:
+            # a complete value is always followed by a delimiter.
+            if not self.eof and (end == len(self.buffer) or self.buffer[end] not in _DELIMITERS):
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+def iter_array(chunks, key=None):
+    """Decode the items of a JSON array one by one while its body is
+    still arriving, so the whole document is never held in memory.
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+        The body of the response, for example
+        :meth:`requests.Response.iter_content`.
+    key : Optional[str]
+        If the document is an object, the key of the array to iterate
+        over, the other members are skipped. A document being an array is
+        iterated over as is.
+
+    Yields
+    ------
+    object
+        The decoded items of the array.
+
+    Raises
+    ------
+    ValueError
+        The document is not valid JSON or has no such array.
+    """
+
+    reader = _Reader(chunks)
+    c = reader.peek()
+    if c == '{' and key is not None:
+        reader.pos += 1
+        while True:
+            if reader.peek() == '}':
+                return
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                break
+            reader.value()
+            if reader.expect(',}') == '}':
+                return
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .utils import parse_datetime
+
+class FenwickTree():
+    """A binary indexed tree over the integers ``0`` to ``size - 1``,
+    giving prefix sums in O(log n). It grows on demand.
+    """
+
+    __slots__ = ('size', '_tree')
+
+    def __init__(self, size=64):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def _grow(self, index):
+        size = self.size
+        while size <= index:
+            size *= 2
+        values = [self.prefix(i) - self.prefix(i - 1) for i in range(self.size)]
+        self.size = size
+        self._tree = [0] * (size + 1)
+        for i, value in enumerate(values):
+            if value:
+                self.add(i, value)
+
+    def add(self, index, delta):
+        """Add ``delta`` to the value at ``index``."""
+
+        if index >= self.size:
+            self._grow(index)
+        i = index + 1
+        tree = self._tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """Returns the sum of the values from ``0`` to ``index`` included."""
+
+        if index < 0:
+            return 0
+        i = min(index, self.size - 1) + 1
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+class _Board():
+    """The scores of the users on one board: a Fenwick tree counting the
+    users per score, and the users of each score for the standings.
+    """
+
+    __slots__ = ('scores', 'counts', 'buckets', 'max_score')
+
+    def __init__(self, logins=()):
+        self.scores = {}
+        self.counts = FenwickTree()
+        self.buckets = {}
+        self.max_score = 0
+        for login in logins:
+            self.add_user(login)
+
+    def add_user(self, login):
+        if login not in self.scores:
+            self.scores[login] = 0
+            self.counts.add(0, 1)
+            self.buckets.setdefault(0, set()).add(login)
+
+    def change(self, login, delta):
+        old = self.scores[login]
+        new = old + delta
+        self.scores[login] = new
+        self.counts.add(old, -1)
+        self.counts.add(new, 1)
+        bucket = self.buckets[old]
+        bucket.discard(login)
+        if not bucket:
+            del self.buckets[old]
+        self.buckets.setdefault(new, set()).add(login)
+        if new > self.max_score:
+            self.max_score = new
+        while self.max_score > 0 and self.max_score not in self.buckets:
+            self.max_score -= 1
+
+    def rank(self, login):
+        score = self.scores.get(login)
+        if score is None:
+            return None
+        # Tied users share the rank: 1 + the number of users ahead.
+        return 1 + len(self.scores) - self.counts.prefix(score), score
+
+    def top(self, n):
+        standings = []
+        rank = 1
+        for score in range(self.max_score, -1, -1):
+            bucket = self.buckets.get(score)
+            if not bucket:
+                continue
+            for login in sorted(bucket):
+                if len(standings) >= n:
+                    return standings
+                standings.append((rank, login, score))
+            rank += len(bucket)
+        return standings
+
+def _timestamp(raw):
+    achieved_at = raw.get('achieved_at')
+    if not achieved_at:
+        return None
+    if isinstance(achieved_at, list):
+        achieved_at = achieved_at[0]
+    return parse_datetime(achieved_at).timestamp()
+
+class Leaderboard():
+    """Incremental trophy standings of a set of users.
+
+    The trophies of every user are kept, so refreshing an user only applies
+    the trophies gained or lost since the previous refresh. Each board keeps
+    a :class:`FenwickTree` of the number of users per score, so the rank of
+    an user is found and updated in O(log n).
+
+    The boards are the overall count of trophies, the count per trophy type
+    and the count of the trophies achieved during each sliding time window
+    of ``windows``. The windows are moved forward on every update and
+    query, the trophies leaving them being popped from a heap.
+
+    Parameters
+    ----------
+    windows : Optional[dict]
+        A dict mapping the name of a window to its length in seconds.
+        Defaults to :attr:`DEFAULT_WINDOWS`.
+
+    Example
+    -------
+    >>> board = Leaderboard()
+    >>> board.extend(intra.users_trophies(logins))
+    >>> board.top(3, type='gold')
+    [(1, 'doe_j', 12), (2, 'smith_a', 9), (2, 'roe_r', 9)]
+    >>> board.rank('doe_j', window='week')
+    (4, 3)
+    """
+
+    #: The default time windows, in seconds.
+    DEFAULT_WINDOWS = {
+        'week': 7 * 86400,
+        'month': 30 * 86400,
+    }
+
+    VERSION = 1
+
+    def __init__(self, windows=None):
+        self.windows = dict(self.DEFAULT_WINDOWS if windows is None else windows)
+        self.trophies = {}
+        self.clock = time.time()
+        self._overall = _Board()
+        self._types = {}
+        self._windows = {name: _Board() for name in self.windows}
+        self._expiries = {name: [] for name in self.windows}
+        self._in_window = {name: {} for name in self.windows}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.trophies)
+
+    def __contains__(self, login):
+        return login in self.trophies
+
+    def _board(self, type=None, window=None):
+        if type is not None and window is not None:
+            raise ValueError('a board is either per type or per window, not both')
+        if window is not None:
+            if window not in self._windows:
+                raise ValueError('unknown window %r' % (window,))
+            self.advance()
+            return self._windows[window]
+        if type is not None:
+            return self._types.get(type)
+        return self._overall
+
+    def _add_user(self, login):
+        self.trophies[login] = {}
+        self._overall.add_user(login)
+        for board in self._types.values():
+            board.add_user(login)
+        for board in self._windows.values():
+            board.add_user(login)
+
+    def _gain(self, login, trophy_id, type, achieved_at):
+        self._overall.change(login, 1)
+        board = self._types.get(type)
+        if board is None:
+            board = self._types[type] = _Board(self.trophies)
+        board.change(login, 1)
+        if achieved_at is None:
+            return
+        for name, length in self.windows.items():
+            expiry = achieved_at + length
+            if expiry > self.clock:
+                self._windows[name].change(login, 1)
+                self._in_window[name][(login, trophy_id)] = expiry
+                heapq.heappush(self._expiries[name], (expiry, login, trophy_id))
+
+    def _lose(self, login, trophy_id, type):
+        self._overall.change(login, -1)
+        self._types[type].change(login, -1)
+        for name in self.windows:
+            # The heap entry is left behind and skipped when popped.
+            if self._in_window[name].pop((login, trophy_id), None) is not None:
+                self._windows[name].change(login, -1)
+
+    def advance(self, now=None):
+        """Move the time windows forward to ``now``, by default the current
+        time, removing the trophies which left them.
+        """
+
+        with self._lock:
+            now = time.time() if now is None else now
+            if now <= self.clock:
+                return
+            self.clock = now
+            for name, heap in self._expiries.items():
+                in_window = self._in_window[name]
+                board = self._windows[name]
+                while heap and heap[0][0] <= now:
+                    expiry, login, trophy_id = heapq.heappop(heap)
+                    if in_window.get((login, trophy_id)) == expiry:
+                        del in_window[(login, trophy_id)]
+                        board.change(login, -1)
+
+    def update(self, login, trophies):
+        """Set the trophies of an user, applying only the difference with
+        the trophies known so far.
+
+        Parameters
+        ----------
+        login : str
+            The login of the user.
+        trophies : iterable of :class:`Trophy` or dict
+            All the trophies of the user, as returned by
+            :func:`Intra.user_trophy` or as raw json objects.
+
+        Returns
+        -------
+        tuple
+            The number of trophies gained and lost.
+        """
+
+        current = {}
+        for trophy in trophies:
+            raw = getattr(trophy, '_raw', trophy)
+            current[raw['id']] = (raw['type'], _timestamp(raw))
+
+        with self._lock:
+            self.advance()
+            if login not in self.trophies:
+                self._add_user(login)
+            known = self.trophies[login]
+            lost = [i for i, value in known.items() if current.get(i) != value]
+            gained = [i for i, value in current.items() if known.get(i) != value]
+            for trophy_id in lost:
+                self._lose(login, trophy_id, known.pop(trophy_id)[0])
+            for trophy_id in gained:
+                type, achieved_at = known[trophy_id] = current[trophy_id]
+                self._gain(login, trophy_id, type, achieved_at)
+            return len(gained), len(lost)
+
+    def extend(self, results):
+        """Update many users.
+
+        Parameters
+        ----------
+        results : dict or iterable of tuple
+            The logins and their trophies, as returned by
+            :func:`Intra.users_trophies` or :func:`Intra.iter_users_trophies`.
+            The logins whose result is ``None`` or an exception are skipped.
+        """
+
+        if isinstance(results, dict):
+            results = results.items()
+        for login, trophies in results:
+            if trophies is not None and not isinstance(trophies, Exception):
+                self.update(login, trophies)
+
+    def remove(self, login):
+        """Remove an user from every board."""
+
+        with self._lock:
+            if login not in self.trophies:
+                return
+            self.update(login, ())
+            del self.trophies[login]
+            for board in [self._overall] + list(self._types.values()) + list(self._windows.values()):
+                del board.scores[login]
+                board.counts.add(0, -1)
+                bucket = board.buckets[0]
+                bucket.discard(login)
+                if not bucket:
+                    del board.buckets[0]
+
+    def rank(self, login, type=None, window=None):
+        """Returns the rank and the score of an user, ``None`` if unknown.
+        The users with the same score share the same rank.
+
+        Parameters
+        ----------
+        login : str
+            The login of the user.
+        type : Optional[str]
+            Rank by the number of trophies of this type.
+        window : Optional[str]
+            Rank by the number of trophies achieved during this window.
+        """
+
+        with self._lock:
+            board = self._board(type, window)
+            if board is None:
+                return (1, 0) if login in self.trophies else None
+            return board.rank(login)
+
+    def score(self, login, type=None, window=None):
+        """Returns the score of an user, ``None`` if unknown. See :func:`rank`."""
+
+        ranked = self.rank(login, type, window)
+        return ranked[1] if ranked is not None else None
+
+    def top(self, n=10, type=None, window=None):
+        """Returns the ``n`` first users as a list of ``(rank, login,
+        score)`` tuples, ties sorted by login. See :func:`rank`.
+        """
+
+        with self._lock:
+            board = self._board(type, window)
+            if board is None:
+                return []
+            return board.top(n)
+
+    def types(self):
+        """Returns the trophy types having a board."""
+
+        return sorted(self._types)
+
+    def save(self, path):
+        """Write the trophies of the users to a file, atomically."""
+
+        with self._lock:
+            state = {
+                'version': self.VERSION,
+                'windows': self.windows,
+                'clock': self.clock,
+                'trophies': {login: [[i, t, a] for i, (t, a) in known.items()]
+                             for login, known in self.trophies.items()},
+            }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.leaderboard-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, windows=None):
+        """Read a leaderboard written by :func:`save`. The boards are built
+        from the stored trophies, without any request.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+        windows : Optional[dict]
+            The time windows, by default the ones of the saved leaderboard.
+        """
+
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != cls.VERSION:
+            raise ValueError('unsupported leaderboard version %r' % (state.get('version'),))
+        board = cls(state['windows'] if windows is None else windows)
+        for login, trophies in state['trophies'].items():
+            board._add_user(login)
+            known = board.trophies[login]
+            for trophy_id, type, achieved_at in trophies:
+                known[trophy_id] = (type, achieved_at)
+                board._gain(login, trophy_id, type, achieved_at)
+        return board
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+
+class DataLoader():
+    """Batches the loads requested during the same tick of the event loop
+    into a single call, in the style of the dataloader pattern.
+
+    Every :func:`load` returns a future. The keys requested before the
+    event loop gets back control are given together to ``batch_load``, so
+    awaiting many loads at once, for example with :func:`asyncio.gather`,
+    costs one batch instead of one call per key.
+
+    Parameters
+    ----------
+    batch_load : coroutine function
+        Called with a list of distinct keys, returns a dict mapping each key
+        to its value. A value being an :class:`Exception` is raised to the
+        loaders of that key, a missing key resolves to ``None``.
+    max_batch_size : Optional[int]
+        Split the batches larger than this.
+    cache : bool
+        If ``True``, the future of a key is kept and returned by the next
+        loads of that key, until :func:`clear`. Else the loads of the same
+        key are only merged within a batch.
+    """
+
+    def __init__(self, batch_load, max_batch_size=None, cache=True):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self.batches = 0
+        self._futures = {}
+        self._queue = []
+        self._scheduled = False
+
+    def load(self, key):
+        """Returns a future resolving to the value of ``key``."""
+
+        if self.cache:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        if self.cache:
+            self._futures[key] = future
+        self._queue.append((key, future))
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    def load_many(self, keys):
+        """Returns a future resolving to the list of the values of ``keys``."""
+
+        return asyncio.gather(*[self.load(key) for key in keys])
+
+    def prime(self, key, value):
+        """Cache a value known for ``key``, if caching is enabled."""
+
+        if self.cache and key not in self._futures:
+            future = asyncio.get_event_loop().create_future()
+            future.set_result(value)
+            self._futures[key] = future
+
+    def clear(self, key=None):
+        """Forget the cached value of ``key``, or of every key."""
+
+        if key is None:
+            self._futures.clear()
+        else:
+            self._futures.pop(key, None)
+
+    def _dispatch(self):
+        self._scheduled = False
+        queue, self._queue = self._queue, []
+        size = self.max_batch_size or len(queue)
+        for i in range(0, len(queue), size):
+            asyncio.ensure_future(self._run(queue[i:i + size]))
+
+    def _fail(self, key, future, error):
+        if self._futures.get(key) is future:
+            del self._futures[key]
+        if not future.done():
+            future.set_exception(error)
+
+    async def _run(self, batch):
+        self.batches += 1
+        keys = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            results = await self.batch_load(keys)
+        except Exception as e:
+            for key, future in batch:
+                self._fail(key, future, e)
+            return
+
+        for key, future in batch:
+            value = results.get(key)
+            if isinstance(value, Exception):
+                self._fail(key, future, value)
+            elif not future.done():
+                future.set_result(value)
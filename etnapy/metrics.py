@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+from bisect import bisect_left
+
+#: The default upper bounds of the latency histograms, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram():
+    """A histogram of observed values with fixed bucket upper bounds.
+
+    Attributes
+    -----------
+    buckets: tuple of float
+        The upper bounds of the buckets.
+    counts: list of int
+        The number of values in each bucket, the last one counting the
+        values above every bound. The counts are not cumulative.
+    sum: float
+        The sum of the observed values.
+    count: int
+        The number of observed values.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Returns an estimation of the ``q`` quantile, the upper bound of
+        the bucket containing it. ``None`` if no value was observed.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        """Returns the histogram as a dict."""
+        return {
+            'buckets': list(self.buckets),
+            'counts': list(self.counts),
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+class Metrics():
+    """A registry of the metrics of the requests sent by :class:`Intra` or
+    :class:`AsyncIntra`, safe to share between threads.
+
+    For every method and host it records the number of requests by status
+    (``error`` for a request failed without answer), a latency histogram
+    and the size of the responses. For every method it records a histogram
+    of the json decoding time, the cache hits, misses and revalidations and
+    the calls collapsed into a running one.
+
+    Parameters
+    ----------
+    buckets : tuple of float
+        The upper bounds of the histograms, in seconds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._requests = {}
+        self._latency = {}
+        self._bytes = {}
+        self._parse = {}
+        self._cache = {}
+        self._coalesced = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint, host, status, latency, nbytes=0):
+        """Record a request.
+
+        Parameters
+        ----------
+        endpoint : str
+            The name of the method which sent the request.
+        host : str
+            The host name.
+        status : Optional[int]
+            The HTTP status, ``None`` if the request failed without answer.
+        latency : float
+            The duration of the request in seconds.
+        nbytes : int
+            The size of the response body.
+        """
+
+        key = (endpoint, host)
+        status = 'error' if status is None else str(status)
+        with self._lock:
+            by_status = self._requests.setdefault(key, {})
+            by_status[status] = by_status.get(status, 0) + 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(self.buckets)
+            histogram.observe(latency)
+            self._bytes[key] = self._bytes.get(key, 0) + nbytes
+
+    def record_parse(self, endpoint, seconds):
+        """Record the time spent decoding a response."""
+
+        with self._lock:
+            histogram = self._parse.get(endpoint)
+            if histogram is None:
+                histogram = self._parse[endpoint] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def record_cache(self, endpoint, result):
+        """Record a cache lookup, ``result`` being ``'hit'``, ``'miss'`` or
+        ``'revalidated'``.
+        """
+
+        key = (endpoint, result)
+        with self._lock:
+            self._cache[key] = self._cache.get(key, 0) + 1
+
+    def record_coalesced(self, endpoint):
+        """Record a call which shared the result of a running one."""
+
+        with self._lock:
+            self._coalesced[endpoint] = self._coalesced.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        """Returns a copy of every metric as a dict.
+
+        Returns
+        -------
+        dict
+            A dict with a ``requests`` list (one dict per method and host
+            with its statuses, latency histogram, p50/p99 estimations and
+            bytes), a ``parse`` dict of histograms per method, a ``cache``
+            dict of results per method and a ``coalesced`` dict per method.
+        """
+
+        with self._lock:
+            requests = []
+            for key, by_status in self._requests.items():
+                latency = self._latency[key]
+                requests.append({
+                    'endpoint': key[0],
+                    'host': key[1],
+                    'count': sum(by_status.values()),
+                    'status': dict(by_status),
+                    'errors': sum(c for s, c in by_status.items() if s == 'error' or int(s) >= 400),
+                    'latency': latency.to_dict(),
+                    'p50': latency.quantile(0.5),
+                    'p99': latency.quantile(0.99),
+                    'bytes': self._bytes.get(key, 0),
+                })
+            cache = {}
+            for (endpoint, result), count in self._cache.items():
+                cache.setdefault(endpoint, {})[result] = count
+            return {
+                'requests': requests,
+                'parse': {endpoint: h.to_dict() for endpoint, h in self._parse.items()},
+                'cache': cache,
+                'coalesced': dict(self._coalesced),
+            }
+
+    def reset(self):
+        """Forget every recorded metric."""
+
+        with self._lock:
+            for registry in (self._requests, self._latency, self._bytes, self._parse,
+                             self._cache, self._coalesced):
+                registry.clear()
+
+def _labels(**labels):
+    return '{%s}' % (','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                              for k, v in labels.items()),)
+
+def _histogram_lines(name, histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(histogram['buckets'], histogram['counts']):
+        cumulative += count
+        yield '%s_bucket%s %d' % (name, _labels(**labels, le=repr(float(bound))), cumulative)
+    yield '%s_bucket%s %d' % (name, _labels(**labels, le='+Inf'), histogram['count'])
+    yield '%s_sum%s %r' % (name, _labels(**labels), histogram['sum'])
+    yield '%s_count%s %d' % (name, _labels(**labels), histogram['count'])
+
+def to_prometheus(metrics, prefix='etnapy'):
+    """Format the metrics in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    metrics : :class:`Metrics`
+        The metrics registry.
+    prefix : str
+        The prefix of the metric names.
+
+    Returns
+    -------
+    str
+        The text to serve with the ``text/plain; version=0.0.4`` content type.
+    """
+
+    snapshot = metrics.snapshot()
+    lines = []
+
+    lines.append('# HELP %s_requests_total Requests sent to the intranet.' % (prefix,))
+    lines.append('# TYPE %s_requests_total counter' % (prefix,))
+    for r in snapshot['requests']:
+        for status, count in sorted(r['status'].items()):
+            lines.append('%s_requests_total%s %d' % (
+                prefix, _labels(endpoint=r['endpoint'], host=r['host'], status=status), count))
+
+    lines.append('# HELP %s_request_duration_seconds Latency of the requests.' % (prefix,))
+    lines.append('# TYPE %s_request_duration_seconds histogram' % (prefix,))
+    for r in snapshot['requests']:
+        lines.extend(_histogram_lines('%s_request_duration_seconds' % (prefix,), r['latency'],
+                                      endpoint=r['endpoint'], host=r['host']))
+
+    lines.append('# HELP %s_response_bytes_total Size of the response bodies.' % (prefix,))
+    lines.append('# TYPE %s_response_bytes_total counter' % (prefix,))
+    for r in snapshot['requests']:
+        lines.append('%s_response_bytes_total%s %d' % (
+            prefix, _labels(endpoint=r['endpoint'], host=r['host']), r['bytes']))
+
+    lines.append('# HELP %s_parse_duration_seconds Time spent decoding the responses.' % (prefix,))
+    lines.append('# TYPE %s_parse_duration_seconds histogram' % (prefix,))
+    for endpoint, histogram in sorted(snapshot['parse'].items()):
+        lines.extend(_histogram_lines('%s_parse_duration_seconds' % (prefix,), histogram, endpoint=endpoint))
+
+    lines.append('# HELP %s_cache_lookups_total Cache lookups by result.' % (prefix,))
+    lines.append('# TYPE %s_cache_lookups_total counter' % (prefix,))
+    for endpoint, results in sorted(snapshot['cache'].items()):
+        for result, count in sorted(results.items()):
+            lines.append('%s_cache_lookups_total%s %d' % (
+                prefix, _labels(endpoint=endpoint, result=result), count))
+
+    lines.append('# HELP %s_coalesced_total Calls which shared the request of a running call.' % (prefix,))
+    lines.append('# TYPE %s_coalesced_total counter' % (prefix,))
+    for endpoint, count in sorted(snapshot['coalesced'].items()):
+        lines.append('%s_coalesced_total%s %d' % (prefix, _labels(endpoint=endpoint), count))
+
+    return '\n'.join(lines) + '\n'
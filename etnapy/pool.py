@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import contextlib
+import queue
+import threading
+import time
+
+from .etnapy import Intra
+
+class IntraPool():
+    """A pool of authenticated :class:`Intra` sessions for parallel workers.
+
+    Each worker checks a session out, uses it alone and returns it, so the
+    requests are spread over several sessions, possibly of several service
+    accounts. Sessions are logged in on their first checkout. A session
+    idle for more than ``health_interval`` seconds is checked with the
+    intranet before being handed out, and renewed if it expired.
+
+    Parameters
+    ----------
+    accounts : list of tuple of (str, str)
+        The ``(user, password)`` of the accounts.
+    size : Optional[int]
+        The number of sessions. They are assigned to the accounts in turn.
+        Defaults to one session per account.
+    health_interval : float
+        The idle time in seconds after which a session is checked.
+    **kwargs
+        Passed to :class:`Intra` for every session, like ``cache`` or
+        ``limiter`` which can be shared.
+    """
+
+    def __init__(self, accounts, size=None, health_interval=300, **kwargs):
+        if not accounts:
+            raise ValueError('At least one account is required')
+        self.accounts = list(accounts)
+        self.size = len(self.accounts) if size is None else size
+        self.health_interval = health_interval
+        self.sessions = []
+        self._idle = queue.Queue()
+        self._credentials = {}
+        self._returned_at = {}
+        self._lock = threading.Lock()
+
+        for i in range(self.size):
+            intra = Intra(**kwargs)
+            self._credentials[id(intra)] = self.accounts[i % len(self.accounts)]
+            self.sessions.append(intra)
+            self._idle.put(intra)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _ensure_logged(self, intra):
+        if not intra.is_logged:
+            user, password = self._credentials[id(intra)]
+            return intra.login(user, password) is not None
+
+        returned_at = self._returned_at.get(id(intra), 0)
+        if not intra.is_session_valid():
+            intra._relogin(intra._auth_generation)
+        elif time.monotonic() - returned_at > self.health_interval:
+            intra.check_session()
+        return intra.is_logged
+
+    def checkout(self, timeout=None):
+        """Take a logged in session from the pool, waiting for one to be
+        returned if they are all in use.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            The maximum number of seconds to wait, forever if ``None``.
+
+        Returns
+        -------
+        :class:`Intra`
+            The session. It must be given back with :func:`checkin`.
+
+        Raises
+        ------
+        queue.Empty
+            No session was returned before the timeout.
+        RuntimeError
+            The session could not log in.
+        """
+
+        intra = self._idle.get(timeout=timeout)
+        try:
+            logged = self._ensure_logged(intra)
+        except BaseException:
+            self._idle.put(intra)
+            raise
+        if not logged:
+            self._idle.put(intra)
+            raise RuntimeError('Could not log in as %s' % (self._credentials[id(intra)][0],))
+        return intra
+
+    def checkin(self, intra):
+        """Give a session back to the pool."""
+
+        with self._lock:
+            self._returned_at[id(intra)] = time.monotonic()
+        self._idle.put(intra)
+
+    @contextlib.contextmanager
+    def session(self, timeout=None):
+        """A context manager checking a session out and giving it back.
+
+        Example
+        -------
+        ::
+
+            with pool.session() as intra:
+                user = intra.user_info('login_x')
+        """
+
+        intra = self.checkout(timeout)
+        try:
+            yield intra
+        finally:
+            self.checkin(intra)
+
+    def stats(self):
+        """Returns a dict with the number of sessions, idle sessions and
+        logged in sessions.
+        """
+
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'logged': sum(1 for intra in self.sessions if intra.is_logged),
+        }
+
+    def close(self):
+        """Log out every session."""
+
+        for intra in self.sessions:
+            intra.logout()
@@ -26,12 +26,15 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
-from datetime import datetime
+from .utils import parse_date, lazy_field, model_getstate, model_setstate
+from .wall import Wall
 
 class Promo():
     """Represents an promotion on the intranet. This class parse
     and give formatted information about an promotion.
 
+    The dates are parsed on first access.
+
     Attributes
     -----------
     id: int
@@ -40,9 +43,9 @@ class Promo():
         The full name of the promotion.
     term_name: str
         The name and month of the promotion.
-    learning_start: :class:`datetime.datetime`
+    learning_start: :class:`datetime.date`
         The start date of the promotion.
-    learning_end: :class:`datetime.datetime`
+    learning_end: :class:`datetime.date`
         The end date of the promotion.
     learning_duration: int
         The duration of the promotion in days.
@@ -52,15 +55,35 @@ class Promo():
         The speciality of promotion.
     wall_name: str
         The name of the wall associated with the promotion.
+    wall: Optional[:class:`Wall`]
+        The wall associated with the promotion, ``None`` if it has none.
     """
 
-    def __init__(self, json_data):
+    __slots__ = ('_raw', 'id', 'target_name', 'term_name', 'learning_duration', 'promo', 'spe',
+                 'wall_name', '_learning_start', '_learning_end', '_client')
+
+    learning_start = lazy_field('learning_start', parse_date)
+    learning_end = lazy_field('learning_end', parse_date)
+
+    __getstate__ = model_getstate
+    __setstate__ = model_setstate
+
+    def __init__(self, json_data, client=None):
+        self._raw = json_data
+        self._client = client
         self.id = json_data["id"]
         self.target_name = json_data["target_name"]
         self.term_name = json_data["term_name"]
-        self.learning_start = datetime.strptime(json_data["learning_start"], '%Y-%m-%d').date()
-        self.learning_end = datetime.strptime(json_data["learning_end"], '%Y-%m-%d').date()
         self.learning_duration = json_data["learning_duration"]
         self.promo = json_data["promo"]
         self.spe = json_data["spe"]
         self.wall_name = json_data["wall_name"]
+
+    @property
+    def wall(self):
+        """A property that returns the wall of the promotion. Nothing is
+        fetched until its conversations are read.
+        """
+        if not self.wall_name:
+            return None
+        return Wall(self.wall_name, self._client)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import threading
+import time
+
+class TokenBucket():
+    """A token bucket, safe to share between threads and asyncio tasks.
+
+    Tokens are reserved in advance: a caller takes its token immediately
+    and then sleeps until the token is actually available, so waiters are
+    served in order without polling.
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens added per second.
+    capacity : Optional[float]
+        The maximum number of tokens, i.e. the size of a burst. Defaults to
+        ``rate``.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(rate if capacity is None else capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take tokens and return the number of seconds to wait before
+        using them.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def pause(self, seconds):
+        """Empty the bucket so that no token is available for ``seconds``,
+        for example after a ``Retry-After`` answer.
+        """
+
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def acquire(self, tokens=1):
+        """Wait until tokens are available. Returns the time waited."""
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens=1):
+        """|coro|
+
+        Wait until tokens are available. Returns the time waited.
+        """
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+class AdaptiveLimit():
+    """A concurrency limit adjusted by additive increase and multiplicative
+    decrease (AIMD), safe to share between threads and asyncio tasks.
+
+    Every successful request raises the limit by ``increase / limit``, i.e.
+    by about ``increase`` per round of requests. A ``429``, a ``5xx`` or a
+    latency above ``latency_target`` multiplies it by ``decrease``, at most
+    once per round so that a burst of failures counts once.
+
+    Parameters
+    ----------
+    initial : int
+        The initial number of requests allowed in flight.
+    minimum : int
+        The lowest limit.
+    maximum : int
+        The highest limit.
+    increase : float
+        The additive increase per round of successful requests.
+    decrease : float
+        The multiplicative decrease factor on congestion.
+    latency_target : Optional[float]
+        The latency in seconds above which a request is a congestion signal.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0, decrease=0.5, latency_target=None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.congestions = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    def _try_enter(self):
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        """Wait for a free slot. Returns the time waited."""
+
+        start = time.monotonic()
+        with self._cond:
+            while not self._try_enter():
+                self._cond.wait()
+        return time.monotonic() - start
+
+    async def acquire_async(self):
+        """|coro|
+
+        Wait for a free slot. Returns the time waited.
+        """
+
+        start = time.monotonic()
+        loop = asyncio.get_event_loop()
+        while True:
+            with self._cond:
+                if self._try_enter():
+                    return time.monotonic() - start
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self, status=None, latency=None):
+        """Free a slot and adjust the limit from the outcome of the request.
+
+        Parameters
+        ----------
+        status : Optional[int]
+            The HTTP status, ``None`` if the request failed without answer.
+        latency : Optional[float]
+            The duration of the request in seconds.
+        """
+
+        with self._cond:
+            self.in_flight -= 1
+            congested = (status is None or status == 429 or status >= 500
+                         or (self.latency_target is not None and latency is not None
+                             and latency > self.latency_target))
+            now = time.monotonic()
+            if congested:
+                # A single decrease per round of in flight requests.
+                if latency is None or now - self._last_decrease > latency:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+                    self.congestions += 1
+            else:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def cancel(self):
+        """Free a slot taken for a request which was not sent, without
+        adjusting the limit.
+        """
+
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class RateLimiter():
+    """Limits the requests sent to each ETNA host with a token bucket and an
+    :class:`AdaptiveLimit` of concurrent requests per host. It can be given
+    to :class:`Intra` and :class:`AsyncIntra`, and shared between them.
+
+    Parameters
+    ----------
+    rate : float
+        The default number of requests per second per host.
+    burst : Optional[float]
+        The default size of a burst of requests per host.
+    rates : Optional[dict]
+        A dict mapping a host name to its own rate.
+    initial_concurrency : int
+        The initial number of requests in flight per host.
+    max_concurrency : int
+        The highest number of requests in flight per host.
+    latency_target : Optional[float]
+        The latency in seconds above which a host is considered congested.
+    """
+
+    def __init__(self, rate=10, burst=None, rates=None, initial_concurrency=4, max_concurrency=32,
+                 latency_target=None):
+        self.rate = rate
+        self.burst = burst
+        self.rates = dict(rates or {})
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, host):
+        """Returns the ``(bucket, limit)`` tuple of a host."""
+
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            with self._lock:
+                limiter = self._hosts.get(host)
+                if limiter is None:
+                    rate = self.rates.get(host, self.rate)
+                    limiter = self._hosts[host] = (
+                        TokenBucket(rate, self.burst),
+                        AdaptiveLimit(self.initial_concurrency, maximum=self.max_concurrency,
+                                      latency_target=self.latency_target),
+                    )
+        return limiter
+
+    def acquire(self, host):
+        """Wait until a request can be sent to a host. Returns the time
+        waited.
+        """
+
+        bucket, limit = self.host(host)
+        waited = limit.acquire()
+        try:
+            return waited + bucket.acquire()
+        except BaseException:
+            limit.cancel()
+            raise
+
+    async def acquire_async(self, host):
+        """|coro|
+
+        Wait until a request can be sent to a host. Returns the time waited.
+        """
+
+        bucket, limit = self.host(host)
+        waited = await limit.acquire_async()
+        try:
+            return waited + await bucket.acquire_async()
+        except BaseException:
+            # Cancelled while waiting for the bucket, e.g. by a timeout.
+            limit.cancel()
+            raise
+
+    def release(self, host, status=None, latency=None, retry_after=None):
+        """Report the outcome of a request sent to a host.
+
+        Parameters
+        ----------
+        host : str
+            The host name.
+        status : Optional[int]
+            The HTTP status, ``None`` if the request failed without answer.
+        latency : Optional[float]
+            The duration of the request in seconds.
+        retry_after : Optional[str]
+            The ``Retry-After`` header of the answer, if any.
+        """
+
+        bucket, limit = self.host(host)
+        limit.release(status, latency)
+        if retry_after:
+            try:
+                bucket.pause(float(retry_after))
+            except ValueError:
+                pass
+
+    def cancel(self, host):
+        """Free the slot of a request to a host which was abandoned before
+        its outcome was known, without adjusting the limit.
+        """
+
+        bucket, limit = self.host(host)
+        limit.cancel()
+
+    def stats(self):
+        """Returns a dict mapping each host to its current concurrency limit,
+        requests in flight and number of congestions.
+        """
+
+        return {
+            host: {
+                'limit': int(limit.limit),
+                'in_flight': limit.in_flight,
+                'congestions': limit.congestions,
+            }
+            for host, (bucket, limit) in list(self._hosts.items())
+        }
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import time
+
+from .promo import Promo
+from .trophy import Trophy
+
+def build_promos(data, client=None):
+    return [Promo(x, client) for x in data]
+
+def build_trophies(data, client=None):
+    return [Trophy(x, client) for x in data]
+
+class JsonRequest():
+    """The steps of a json ``GET`` which do no I/O, shared by :class:`Intra`
+    and :class:`AsyncIntra`: the cache lookup and the conditional headers
+    of a stale entry, the metrics, the span of the request and the decoding
+    of the body. The client only sends the request, with :attr:`headers`
+    and :attr:`span`.
+
+    Parameters
+    ----------
+    client : :class:`Intra` or :class:`AsyncIntra`
+        The client sending the request.
+    endpoint : str
+        The name of the calling method.
+    url : str
+        The URL requested.
+    login : Optional[str]
+        The login the response is about, given to the cache.
+    """
+
+    __slots__ = ('client', 'endpoint', 'url', 'login', 'ttl', 'entry', 'headers', 'span')
+
+    def __init__(self, client, endpoint, url, login=None):
+        self.client = client
+        self.endpoint = endpoint
+        self.url = url
+        self.login = login
+        cache = client.cache
+        self.ttl = cache.ttl(endpoint) if cache is not None else None
+        self.entry = None
+        self.headers = {}
+        self.span = None
+
+    def lookup(self):
+        """Look the URL up in the cache. Returns ``True`` if it is answered
+        by a fresh entry, :attr:`entry`. Else prepares the headers
+        revalidating a stale entry and starts the span of the request.
+        """
+
+        client = self.client
+        metrics = client.metrics
+        if self.ttl is not None:
+            entry = client.cache.get(self.url)
+            if entry is not None and entry.is_fresh():
+                if metrics is not None:
+                    metrics.record_cache(self.endpoint, 'hit')
+                self.entry = entry
+                return True
+            if metrics is not None:
+                metrics.record_cache(self.endpoint, 'miss')
+            if entry is not None:
+                self.entry = entry
+                if entry.etag is not None:
+                    self.headers['If-None-Match'] = entry.etag
+                if entry.last_modified is not None:
+                    self.headers['If-Modified-Since'] = entry.last_modified
+
+        if client.tracer is not None:
+            self.span = client.tracer.start(self.endpoint, 'GET', self.url)
+        return False
+
+    def failed(self):
+        """Emit the span of a request which raised."""
+
+        if self.span is not None:
+            self.client.tracer.emit(self.span)
+
+    def revalidated(self, status):
+        """Returns ``True`` if the answer ``status`` confirms the stale
+        entry, whose expiry is then extended.
+        """
+
+        if status != 304 or self.entry is None:
+            return False
+        self.client.cache.refresh(self.url, self.ttl)
+        if self.client.metrics is not None:
+            self.client.metrics.record_cache(self.endpoint, 'revalidated')
+        return True
+
+    def decode(self, body, headers):
+        """Decode the body of a successful answer and store it in the cache
+        if the endpoint is cached. Returns the decoded json.
+        """
+
+        client = self.client
+        start = time.monotonic()
+        data = client._loads(body)
+        elapsed = time.monotonic() - start
+        if client.metrics is not None:
+            client.metrics.record_parse(self.endpoint, elapsed)
+        if self.span is not None:
+            self.span.add('decode', elapsed)
+        if self.ttl is not None:
+            client.cache.put(self.url, data, self.ttl, login=self.login,
+                             etag=headers.get('ETag'),
+                             last_modified=headers.get('Last-Modified'),
+                             endpoint=self.endpoint)
+        return data
+
+def finish_json(client, endpoint, build, data, span, leader=True):
+    """Give the json of a request to ``build`` if any and emit the span of
+    the request. A caller which shared the request of another one, the
+    ``leader``, is counted as coalesced and emits no span.
+    """
+
+    if not leader:
+        span = None
+        if client.metrics is not None:
+            client.metrics.record_coalesced(endpoint)
+    if data is not None and build is not None:
+        start = time.monotonic()
+        data = build(data)
+        if span is not None:
+            span.add('build', time.monotonic() - start)
+    if span is not None:
+        client.tracer.emit(span)
+    return data
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from .wall import WallPageError, page_conversations
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    wall TEXT NOT NULL,
+    author TEXT,
+    title TEXT,
+    created_at TEXT,
+    fingerprint TEXT NOT NULL,
+    data TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_wall ON conversations (wall, created_at);
+CREATE INDEX IF NOT EXISTS conversations_author ON conversations (author, created_at);
+CREATE TABLE IF NOT EXISTS syncs (
+    wall TEXT PRIMARY KEY,
+    newest_id INTEGER,
+    synced_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS conversations_text USING fts5(
+    title, body, tokenize = 'unicode61 remove_diacritics 1'
+);
+"""
+
+def _login(value):
+    if isinstance(value, dict):
+        return value.get('login')
+    return value
+
+def _author(conversation):
+    for key in ('user', 'author'):
+        login = _login(conversation.get(key))
+        if login:
+            return login
+    messages = conversation.get('messages') or []
+    return _login(messages[0].get('user')) if messages and isinstance(messages[0], dict) else None
+
+def _body(conversation):
+    texts = []
+    for message in conversation.get('messages') or []:
+        if isinstance(message, dict):
+            texts.append(message.get('content') or message.get('message') or '')
+        else:
+            texts.append(str(message))
+    if not texts and conversation.get('content'):
+        texts.append(conversation['content'])
+    return '\n'.join(texts)
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+def _match(text):
+    # Every word must appear; quoting keeps the FTS5 syntax out of the
+    # user input.
+    return ' '.join('"%s"' % (word.replace('"', '""'),) for word in text.split())
+
+class WallIndex():
+    """A full-text index of the wall conversations stored in a SQLite file,
+    to search the history of the walls without any request.
+
+    Give it to :class:`Intra` with its ``index`` parameter and every page
+    fetched by :func:`Intra.wall_messages` is added to it, or fill it with
+    :func:`sync`. Adding a conversation already indexed and unchanged costs
+    a lookup, a changed one replaces the former version.
+
+    The titles and messages are indexed with SQLite FTS5, the authors, the
+    walls and the creation dates with regular indexes.
+
+    Parameters
+    ----------
+    path : str
+        The path of the database file.
+    timeout : float
+        How many seconds to wait for a lock held by another process.
+
+    Raises
+    ------
+    RuntimeError
+        The SQLite library was built without FTS5.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        try:
+            with self._connection() as conn:
+                conn.executescript(_SCHEMA)
+        except sqlite3.OperationalError as e:
+            if 'fts5' in str(e):
+                raise RuntimeError('WallIndex requires a SQLite library built with FTS5') from e
+            raise
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, wall, conversations):
+        """Index conversations of a wall.
+
+        Parameters
+        ----------
+        wall : str
+            The name of the wall.
+        conversations : iterable of dict
+            The json objects of the conversations, or a page returned by
+            :func:`Intra.wall_messages`.
+
+        Returns
+        -------
+        int
+            The number of conversations added or updated.
+        """
+
+        if conversations is None or isinstance(conversations, dict):
+            conversations = page_conversations(conversations)
+        rows = []
+        for conversation in conversations:
+            if conversation.get('id') is None:
+                continue
+            data = json.dumps(conversation, sort_keys=True)
+            rows.append((conversation, data, hashlib.sha1(data.encode('utf-8')).hexdigest()))
+        if not rows:
+            return 0
+
+        now = time.time()
+        changed = 0
+        conn = self._connection()
+        with conn:
+            for conversation, data, fingerprint in rows:
+                conversation_id = conversation['id']
+                row = conn.execute('SELECT fingerprint FROM conversations WHERE id = ?',
+                                   (conversation_id,)).fetchone()
+                if row is not None and row[0] == fingerprint:
+                    continue
+                conn.execute(
+                    'INSERT OR REPLACE INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (conversation_id, wall, _author(conversation), conversation.get('title'),
+                     conversation.get('created_at'), fingerprint, data, now)
+                )
+                conn.execute('DELETE FROM conversations_text WHERE rowid = ?', (conversation_id,))
+                conn.execute('INSERT INTO conversations_text (rowid, title, body) VALUES (?, ?, ?)',
+                             (conversation_id, conversation.get('title') or '', _body(conversation)))
+                changed += 1
+        return changed
+
+    def sync(self, intra, walls=None, page_size=50):
+        """Fetch the conversations posted since the last complete sync, on
+        every wall or on the given walls. The first sync of a wall fetches
+        its whole history.
+
+        The newest conversation of a wall is recorded as its sync marker
+        only once the previous marker or the end of the wall is reached.
+        If a page fails, the wall keeps its previous marker and the next
+        sync fetches the missing range again; the other walls are still
+        synced.
+
+        Returns
+        -------
+        int
+            The number of conversations added.
+        """
+
+        if walls is None:
+            walls = intra.walls_list() or []
+        before = len(self)
+        # A client holding this index already adds every page it fetches.
+        feeds = getattr(intra, 'index', None) is not self
+        for wall in walls:
+            newest = None
+            batch = []
+            try:
+                for conversation in intra.iter_wall(wall, page_size, self.synced_id(wall)):
+                    if newest is None:
+                        newest = conversation.get('id')
+                    if feeds:
+                        batch.append(conversation)
+                        if len(batch) >= page_size:
+                            self.add(wall, batch)
+                            batch = []
+            except WallPageError:
+                self.add(wall, batch)
+                continue
+            self.add(wall, batch)
+            self._mark_synced(wall, newest)
+        return len(self) - before
+
+    def _mark_synced(self, wall, newest):
+        conn = self._connection()
+        with conn:
+            if newest is None:
+                # Nothing new: keep the marker, or record an empty wall.
+                conn.execute('INSERT OR IGNORE INTO syncs VALUES (?, NULL, ?)', (wall, time.time()))
+                conn.execute('UPDATE syncs SET synced_at = ? WHERE wall = ?', (time.time(), wall))
+            else:
+                conn.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)', (wall, newest, time.time()))
+
+    def synced_id(self, wall):
+        """Returns the ID of the newest conversation of a wall at its last
+        complete :func:`sync`, or ``None``.
+        """
+
+        row = self._connection().execute('SELECT newest_id FROM syncs WHERE wall = ?', (wall,)).fetchone()
+        return row[0] if row is not None else None
+
+    def search(self, text=None, author=None, wall=None, since=None, until=None, limit=50):
+        """Search the indexed conversations. The criteria given must all
+        match.
+
+        Parameters
+        ----------
+        text : Optional[str]
+            Words that must all appear in the title or the messages,
+            accents and case ignored.
+        author : Optional[str]
+            The login of the author of the conversation.
+        wall : Optional[str]
+            The name of the wall.
+        since : Optional[str or datetime.date or datetime.datetime]
+            The earliest creation date, included.
+        until : Optional[str or datetime.date or datetime.datetime]
+            The latest creation date, excluded.
+        limit : int
+            The maximum number of results.
+
+        Returns
+        -------
+        list of dict
+            The json objects of the conversations, the best matches first
+            if ``text`` is given, else the newest first.
+        """
+
+        clauses = []
+        params = []
+        if text:
+            query = ('SELECT c.data FROM conversations_text t JOIN conversations c ON c.id = t.rowid '
+                     'WHERE conversations_text MATCH ?')
+            params.append(_match(text))
+            order = 'ORDER BY t.rank'
+        else:
+            query = 'SELECT c.data FROM conversations c WHERE 1'
+            order = 'ORDER BY c.created_at DESC, c.id DESC'
+        if author is not None:
+            clauses.append('c.author = ?')
+            params.append(author)
+        if wall is not None:
+            clauses.append('c.wall = ?')
+            params.append(wall)
+        if since is not None:
+            clauses.append('c.created_at >= ?')
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append('c.created_at < ?')
+            params.append(_timestamp(until))
+        for clause in clauses:
+            query += ' AND ' + clause
+        query += ' %s LIMIT ?' % (order,)
+        params.append(limit)
+        return [json.loads(row[0]) for row in self._connection().execute(query, params)]
+
+    def newest_id(self, wall):
+        """Returns the ID of the newest conversation indexed for a wall, or
+        ``None``.
+        """
+
+        row = self._connection().execute(
+            'SELECT id FROM conversations WHERE wall = ? ORDER BY created_at DESC, id DESC LIMIT 1', (wall,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def walls(self):
+        """Returns a dict mapping each wall indexed to its number of
+        conversations.
+        """
+
+        return dict(self._connection().execute('SELECT wall, COUNT(*) FROM conversations GROUP BY wall'))
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+
+    def clear(self, wall=None):
+        """Drop the conversations of a wall, or of every wall."""
+
+        conn = self._connection()
+        with conn:
+            if wall is None:
+                conn.execute('DELETE FROM conversations')
+                conn.execute('DELETE FROM conversations_text')
+                conn.execute('DELETE FROM syncs')
+            else:
+                conn.execute('DELETE FROM syncs WHERE wall = ?', (wall,))
+                conn.execute('DELETE FROM conversations_text WHERE rowid IN '
+                             '(SELECT id FROM conversations WHERE wall = ?)', (wall,))
+                conn.execute('DELETE FROM conversations WHERE wall = ?', (wall,))
+
+    def close(self):
+        """Close the connection of the calling thread."""
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from requests.cookies import create_cookie
+
+_VERSION = 2
+
+def dump_cookies(jar):
+    """Returns the cookies of a jar as a list of json dicts."""
+
+    return [{
+        'name': c.name,
+        'value': c.value,
+        'domain': c.domain,
+        'path': c.path,
+        'secure': c.secure,
+        'expires': c.expires,
+        'rest': dict(c._rest),
+    } for c in jar]
+
+def load_cookies(jar, cookies):
+    """Set the cookies dumped by :func:`dump_cookies` in a jar."""
+
+    for cookie in cookies:
+        jar.set_cookie(create_cookie(**cookie))
+
+class SessionFile():
+    """A file sharing the authenticated sessions of :class:`Intra` between
+    the processes of a host, so that they log in once instead of once per
+    process. Give it to every :class:`Intra` through ``session_file``.
+
+    The file holds, for each user, the session cookies, the
+    ``etna_login``, the expiry of the session and a salted PBKDF2 hash of
+    the password; never the password itself. A saved session is only
+    reused by :func:`Intra.login` with the password which created it. The
+    file is created readable by its owner only and replaced atomically, so
+    it is read without locking. Renewing a session takes an exclusive lock
+    on ``path + '.lock'`` and reads the file again: the processes which
+    were waiting adopt the session saved by the first one instead of
+    logging in too.
+
+    .. note::
+
+        Anyone able to read the file can use the session, keep it in a
+        private directory.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    timeout : float
+        How many seconds to wait for the lock. Past this delay the session
+        is renewed without it.
+
+    Attributes
+    -----------
+    path: str
+        The path of the file.
+    """
+
+    #: The number of PBKDF2 iterations of the password hashes.
+    HASH_ITERATIONS = 100000
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+
+    @classmethod
+    def hash_password(cls, password):
+        """Returns the fields of a session record checking ``password``:
+        a random salt, the number of iterations and the PBKDF2 hash.
+        """
+
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, cls.HASH_ITERATIONS)
+        return {
+            'salt': salt.hex(),
+            'iterations': cls.HASH_ITERATIONS,
+            'password_hash': digest.hex(),
+        }
+
+    @staticmethod
+    def check_password(session, password):
+        """Returns ``True`` if ``password`` is the one hashed in a session
+        record by :func:`hash_password`.
+        """
+
+        try:
+            salt = bytes.fromhex(session['salt'])
+            expected = bytes.fromhex(session['password_hash'])
+            iterations = int(session['iterations'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+        return hmac.compare_digest(digest, expected)
+
+    @staticmethod
+    def key(auth_url, user):
+        """Returns the key of the session of ``user`` on the
+        authentication service ``auth_url``.
+        """
+        return '%s|%s' % (auth_url, user)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """A context manager holding the exclusive lock of the file.
+        Without :mod:`fcntl` (on Windows), it does nothing.
+        """
+
+        if fcntl is None:
+            yield
+            return
+
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        locked = False
+        try:
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.05)
+            yield
+        finally:
+            if locked:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != _VERSION:
+            return {}
+        return data.get('sessions') or {}
+
+    def load(self, key):
+        """Get a saved session.
+
+        Returns
+        -------
+        dict or ``None``
+            The session saved under ``key``, ``None`` if there is none or
+            the file is unreadable.
+        """
+
+        return self._read().get(key)
+
+    def _write(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.session-')
+        try:
+            # mkstemp creates the file readable by its owner only.
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': _VERSION, 'sessions': sessions}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save(self, key, session):
+        """Save a session under ``key``. Call it with the :func:`lock`
+        held so that concurrent saves are not lost.
+        """
+
+        sessions = self._read()
+        sessions[key] = session
+        self._write(sessions)
+
+    def remove(self, key, saved_at=None):
+        """Remove the session saved under ``key``, only if it was saved at
+        ``saved_at`` when given.
+        """
+
+        with self.lock():
+            sessions = self._read()
+            session = sessions.get(key)
+            if session is None or (saved_at is not None and session.get('saved_at') != saved_at):
+                return
+            del sessions[key]
+            self._write(sessions)
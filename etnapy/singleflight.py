@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import threading
+
+class _Call():
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight():
+    """Collapses identical concurrent calls into one: while a call for a key
+    is running, the other callers with the same key wait for it and get its
+    result (or its exception) instead of running their own.
+
+    Threads and asyncio tasks are tracked separately, a thread never waits
+    for a task and conversely.
+
+    Attributes
+    -----------
+    calls: int
+        The number of calls actually run.
+    collapsed: int
+        The number of calls that shared the result of a running call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` unless a call with the same key is
+        running in another thread, in which case wait for its result.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """|coro|
+
+        Await ``func(*args, **kwargs)`` unless a call with the same key is
+        running in another task, in which case wait for its result.
+        """
+
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.collapsed += 1
+            else:
+                future = self._futures[key] = asyncio.ensure_future(func(*args, **kwargs))
+                future.add_done_callback(lambda f: self._discard(key, f))
+                self.calls += 1
+
+        # A caller being cancelled must not cancel the shared call.
+        return await asyncio.shield(future)
+
+    def _discard(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
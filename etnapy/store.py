@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from .cache import CacheEntry, ResponseCache
+from .user import User
+from .promo import Promo
+from .trophy import Trophy
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    endpoint TEXT,
+    login TEXT,
+    data TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_login ON responses (login);
+CREATE TABLE IF NOT EXISTS users (
+    login TEXT PRIMARY KEY,
+    id INTEGER,
+    firstname TEXT,
+    lastname TEXT,
+    email TEXT,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS promos (
+    login TEXT NOT NULL,
+    promo_id INTEGER NOT NULL,
+    wall_name TEXT,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (login, promo_id)
+);
+CREATE TABLE IF NOT EXISTS trophies (
+    login TEXT NOT NULL,
+    trophy_id INTEGER NOT NULL,
+    type TEXT,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (login, trophy_id)
+);
+"""
+
+# SQLite default limit of host parameters in a statement is 999.
+_CHUNK = 500
+
+class SQLiteCache():
+    """A persistent cache of the intranet responses stored in a SQLite file.
+    It can be given to :class:`Intra` instead of a :class:`ResponseCache`,
+    with the same TTL semantics, and can be shared by several processes:
+    the database runs in WAL mode so readers never block the writer.
+
+    Besides the raw json of every cached response, the users, promotions
+    and trophies are stored as records with their fetch timestamp, so
+    they can be read in bulk with :func:`load_users`, :func:`load_promos`
+    and :func:`load_trophies` without any request.
+
+    Parameters
+    ----------
+    path : str
+        The path of the database file.
+    ttls : Optional[dict]
+        A dict mapping an :class:`Intra` method name to its time to live in
+        seconds, merged over :attr:`ResponseCache.DEFAULT_TTLS`.
+    timeout : float
+        How many seconds to wait for a lock held by another process.
+
+    Attributes
+    -----------
+    hits: int
+        The number of lookups answered by a fresh entry in this process.
+    misses: int
+        The number of lookups without a fresh entry in this process.
+    revalidations: int
+        The number of stale entries refreshed by a ``304`` answer.
+    """
+
+    DEFAULT_TTLS = ResponseCache.DEFAULT_TTLS
+
+    def __init__(self, path, ttls=None, timeout=30):
+        self.path = path
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def ttl(self, endpoint):
+        """Returns the time to live of an endpoint or ``None`` if it must not
+        be cached.
+        """
+        return self.ttls.get(endpoint)
+
+    def get(self, url):
+        """Get the entry of an URL, fresh or stale.
+
+        Returns
+        -------
+        :class:`CacheEntry` or ``None``
+            The entry or ``None`` if the URL is not cached.
+        """
+
+        row = self._connection().execute(
+            'SELECT data, expires_at, login, etag, last_modified FROM responses WHERE url = ?',
+            (url,)
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+
+        entry = CacheEntry(json.loads(row[0]), row[1], row[2], row[3], row[4])
+        self._count('hits' if entry.is_fresh() else 'misses')
+        return entry
+
+    def put(self, url, data, ttl, login=None, etag=None, last_modified=None, endpoint=None):
+        """Store the decoded body of an URL for ``ttl`` seconds. The
+        responses of :func:`Intra.user_info`, :func:`Intra.user_promo` and
+        :func:`Intra.user_trophy` are also stored as records.
+        """
+
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, endpoint, login, json.dumps(data), etag, last_modified, now, now + ttl)
+            )
+            if login is None:
+                pass
+            elif endpoint == 'user_info':
+                conn.execute(
+                    'INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (login, data.get('id'), data.get('firstname'), data.get('lastname'),
+                     data.get('email'), json.dumps(data), now)
+                )
+            elif endpoint == 'user_promo':
+                conn.execute('DELETE FROM promos WHERE login = ?', (login,))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO promos VALUES (?, ?, ?, ?, ?)',
+                    [(login, x.get('id'), x.get('wall_name'), json.dumps(x), now) for x in data]
+                )
+            elif endpoint == 'user_trophy':
+                conn.execute('DELETE FROM trophies WHERE login = ?', (login,))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO trophies VALUES (?, ?, ?, ?, ?)',
+                    [(login, x.get('id'), x.get('type'), json.dumps(x), now) for x in data]
+                )
+        return CacheEntry(data, now + ttl, login, etag, last_modified)
+
+    def refresh(self, url, ttl):
+        """Extend the expiry of a revalidated entry."""
+
+        with self._connection() as conn:
+            conn.execute('UPDATE responses SET expires_at = ? WHERE url = ?', (time.time() + ttl, url))
+        self._count('revalidations')
+
+    def invalidate(self, login):
+        """Drop every response and record about a login.
+
+        Returns
+        -------
+        int
+            The number of responses dropped.
+        """
+
+        with self._connection() as conn:
+            count = conn.execute('DELETE FROM responses WHERE login = ?', (login,)).rowcount
+            for table in ('users', 'promos', 'trophies'):
+                conn.execute('DELETE FROM %s WHERE login = ?' % (table,), (login,))
+        return count
+
+    def clear(self):
+        """Drop every response and record. The counters are kept."""
+
+        with self._connection() as conn:
+            for table in ('responses', 'users', 'promos', 'trophies'):
+                conn.execute('DELETE FROM %s' % (table,))
+
+    def stats(self):
+        """Returns a dict with the counters and the size of the cache."""
+
+        size = self._connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        with self._lock:
+            return {
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+            }
+
+    def _select(self, table, logins, max_age):
+        logins = list(dict.fromkeys(logins))
+        conn = self._connection()
+        min_fetched = 0 if max_age is None else time.time() - max_age
+        for i in range(0, len(logins), _CHUNK):
+            chunk = logins[i:i + _CHUNK]
+            query = 'SELECT login, data FROM %s WHERE fetched_at >= ? AND login IN (%s)' % (
+                table, ', '.join('?' * len(chunk)))
+            for row in conn.execute(query, [min_fetched] + chunk):
+                yield row[0], json.loads(row[1])
+
+    def load_users(self, logins, max_age=None):
+        """Read stored users in bulk.
+
+        Parameters
+        ----------
+        logins : iterable of str
+            The users logins.
+        max_age : Optional[float]
+            Ignore the records fetched more than ``max_age`` seconds ago.
+
+        Returns
+        -------
+        dict
+            A dict mapping the login of each stored user to its
+            :class:`User`. Unknown logins are missing from the dict.
+        """
+
+        return {login: User(data) for login, data in self._select('users', logins, max_age)}
+
+    def load_promos(self, logins, max_age=None):
+        """Read stored promotions in bulk. See :func:`load_users`.
+
+        Returns
+        -------
+        dict
+            A dict mapping each stored login to its list of :class:`Promo`.
+        """
+
+        result = {}
+        for login, data in self._select('promos', logins, max_age):
+            result.setdefault(login, []).append(Promo(data))
+        return result
+
+    def load_trophies(self, logins, max_age=None):
+        """Read stored trophies in bulk. See :func:`load_users`.
+
+        Returns
+        -------
+        dict
+            A dict mapping each stored login to its list of :class:`Trophy`.
+        """
+
+        result = {}
+        for login, data in self._select('trophies', logins, max_age):
+            result.setdefault(login, []).append(Trophy(data))
+        return result
+
+    def close(self):
+        """Close the connection of the calling thread."""
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
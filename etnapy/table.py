@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import heapq
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .utils import parse_datetime
+
+_EPOCH = datetime(1970, 1, 1)
+
+_BUCKETS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400,
+}
+
+class TrophyTable():
+    """A columnar container of trophies for promotion-wide analytics.
+
+    The trophies are stored in typed arrays, one per column (owner login,
+    trophy ID, type and date of presentation), the logins and types being
+    dictionary-encoded. No :class:`Trophy` object is kept, so hundreds of
+    thousands of trophies fit in a few megabytes. When NumPy is installed
+    the queries are vectorised on zero-copy views of the columns.
+
+    Parameters
+    ----------
+    use_numpy : Optional[bool]
+        Force the use of NumPy or of the pure Python implementation. By
+        default NumPy is used if it can be imported.
+    """
+
+    def __init__(self, use_numpy=None):
+        if use_numpy and np is None:
+            raise RuntimeError('NumPy is not installed')
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.logins = []
+        self.types = []
+        self._login_codes = {}
+        self._type_codes = {}
+        self._login = array('I')
+        self._trophy_id = array('q')
+        self._type = array('I')
+        self._achieved_at = array('d')
+
+    def __len__(self):
+        return len(self._trophy_id)
+
+    @staticmethod
+    def _code(codes, values, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, login, trophies):
+        """Append the trophies of an user.
+
+        Parameters
+        ----------
+        login : str
+            The login of the owner of the trophies.
+        trophies : iterable of :class:`Trophy` or dict
+            The trophies, as returned by :func:`Intra.user_trophy` or as raw
+            json objects.
+        """
+
+        login_code = self._code(self._login_codes, self.logins, login)
+        ids = []
+        types = []
+        dates = []
+        for trophy in trophies:
+            raw = getattr(trophy, '_raw', trophy)
+            ids.append(raw['id'])
+            types.append(self._code(self._type_codes, self.types, raw['type']))
+            achieved_at = raw.get('achieved_at')
+            if achieved_at:
+                dates.append((parse_datetime(achieved_at[0]) - _EPOCH).total_seconds())
+            else:
+                dates.append(float('nan'))
+
+        self._login.extend([login_code] * len(ids))
+        self._trophy_id.extend(ids)
+        self._type.extend(types)
+        self._achieved_at.extend(dates)
+
+    def extend(self, results):
+        """Append the trophies of many users.
+
+        Parameters
+        ----------
+        results : dict or iterable of tuple
+            The logins and their trophies, as returned by
+            :func:`Intra.users_trophies` or :func:`Intra.iter_users_trophies`.
+            The logins whose result is ``None`` or an exception are skipped.
+        """
+
+        if isinstance(results, dict):
+            results = results.items()
+        for login, trophies in results:
+            if trophies is not None and not isinstance(trophies, Exception):
+                self.append(login, trophies)
+
+    def columns(self):
+        """Returns the columns as NumPy arrays sharing the memory of the
+        table, the logins and types being codes indexing :attr:`logins` and
+        :attr:`types`. The date column is in seconds since the epoch, NaN
+        when unknown.
+
+        The table cannot grow while the returned arrays are alive.
+        """
+
+        if np is None:
+            raise RuntimeError('NumPy is not installed')
+
+        def view(column):
+            dtype = np.dtype(column.typecode)
+            if not column:
+                return np.empty(0, dtype=dtype)
+            return np.frombuffer(column, dtype=dtype)
+
+        return {
+            'login': view(self._login),
+            'trophy_id': view(self._trophy_id),
+            'type': view(self._type),
+            'achieved_at': view(self._achieved_at),
+        }
+
+    def count_by_type(self):
+        """Returns a dict mapping each trophy type to its number of
+        trophies.
+        """
+
+        if self.use_numpy:
+            counts = np.bincount(self.columns()['type'], minlength=len(self.types))
+            return {t: int(c) for t, c in zip(self.types, counts)}
+        counts = Counter(self._type)
+        return {t: counts[i] for i, t in enumerate(self.types)}
+
+    def count_by_user(self, type=None):
+        """Returns a dict mapping each login to its number of trophies.
+
+        Parameters
+        ----------
+        type : Optional[str]
+            Count only the trophies of this type.
+        """
+
+        if type is not None and type not in self._type_codes:
+            return {login: 0 for login in self.logins}
+        code = self._type_codes.get(type)
+
+        if self.use_numpy:
+            cols = self.columns()
+            logins = cols['login'] if code is None else cols['login'][cols['type'] == code]
+            counts = np.bincount(logins, minlength=len(self.logins))
+            return {login: int(c) for login, c in zip(self.logins, counts)}
+
+        if code is None:
+            counts = Counter(self._login)
+        else:
+            counts = Counter(l for l, t in zip(self._login, self._type) if t == code)
+        return {login: counts[i] for i, login in enumerate(self.logins)}
+
+    def top(self, n=10, type=None):
+        """Returns the ``n`` users having the most trophies.
+
+        Parameters
+        ----------
+        n : int
+            The number of users.
+        type : Optional[str]
+            Count only the trophies of this type.
+
+        Returns
+        -------
+        list of tuple of (str, int)
+            The logins and their number of trophies, by decreasing count.
+        """
+
+        counts = self.count_by_user(type)
+        return heapq.nlargest(n, counts.items(), key=lambda x: x[1])
+
+    def histogram(self, bucket='month', type=None):
+        """Count the trophies presented in each period of time.
+
+        Parameters
+        ----------
+        bucket : str or int
+            The size of the periods: ``'hour'``, ``'day'``, ``'week'``,
+            ``'month'`` or a number of seconds.
+        type : Optional[str]
+            Count only the trophies of this type.
+
+        Returns
+        -------
+        list of tuple of (:class:`datetime.datetime`, int)
+            The start of each non empty period and its number of trophies,
+            in chronological order.
+        """
+
+        code = self._type_codes.get(type)
+        if type is not None and code is None:
+            return []
+
+        if self.use_numpy:
+            cols = self.columns()
+            dates = cols['achieved_at']
+            mask = ~np.isnan(dates)
+            if code is not None:
+                mask &= cols['type'] == code
+            seconds = dates[mask].astype('int64')
+            if bucket == 'month':
+                starts = seconds.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype('int64')
+            else:
+                width = _BUCKETS.get(bucket, bucket)
+                starts = seconds - seconds % width
+            values, counts = np.unique(starts, return_counts=True)
+            return [(_EPOCH + timedelta(seconds=int(v)), int(c)) for v, c in zip(values, counts)]
+
+        counts = Counter()
+        width = None if bucket == 'month' else _BUCKETS.get(bucket, bucket)
+        for seconds, t in zip(self._achieved_at, self._type):
+            if seconds != seconds or (code is not None and t != code):
+                continue
+            seconds = int(seconds)
+            if width is None:
+                date = _EPOCH + timedelta(seconds=seconds)
+                counts[datetime(date.year, date.month, 1)] += 1
+            else:
+                counts[_EPOCH + timedelta(seconds=seconds - seconds % width)] += 1
+        return sorted(counts.items())
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import time
+from collections import deque
+
+#: The phases of a request, in order.
+PHASES = ('queue', 'connect', 'ttfb', 'download', 'decode', 'build')
+
+class Span():
+    """The timing of a request sent to the intranet, broken down into
+    phases. Every phase is in seconds and missing phases did not happen
+    (``connect`` is missing when a pooled connection was reused):
+
+    - ``queue``: waiting for the rate limiter,
+    - ``connect``: establishing the TCP connection and TLS session,
+    - ``ttfb``: from sending the request to receiving the headers,
+    - ``download``: receiving the body,
+    - ``decode``: decoding the json body,
+    - ``build``: building the :class:`User`, :class:`Promo` or
+      :class:`Trophy` objects.
+
+    Attributes
+    -----------
+    endpoint: str
+        The name of the method which sent the request.
+    method: str
+        The HTTP method.
+    url: str
+        The URL of the request.
+    status: Optional[int]
+        The HTTP status, ``None`` if no answer was received.
+    error: Optional[str]
+        The exception raised by the request, if any.
+    started_at: float
+        The timestamp of the start of the request.
+    duration: float
+        The total duration in seconds, set when the span ends.
+    phases: dict
+        The duration of each phase.
+    """
+
+    __slots__ = ('endpoint', 'method', 'url', 'status', 'error', 'started_at', 'duration',
+                 'phases', '_start')
+
+    def __init__(self, endpoint, method, url):
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.status = None
+        self.error = None
+        self.started_at = time.time()
+        self.duration = None
+        self.phases = {}
+        self._start = time.monotonic()
+
+    def add(self, phase, seconds):
+        """Add time to a phase. A request replayed after a new login adds
+        the time of both attempts.
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def end(self):
+        """Set the total duration of the span."""
+        self.duration = time.monotonic() - self._start
+
+    def to_dict(self):
+        """Returns the span as a dict."""
+        return {
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'url': self.url,
+            'status': self.status,
+            'error': self.error,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'phases': dict(self.phases),
+        }
+
+    def __repr__(self):
+        phases = ' '.join('%s=%.1fms' % (p, self.phases[p] * 1000) for p in PHASES if p in self.phases)
+        return '<Span %s %s %s %.1fms %s>' % (self.endpoint, self.method, self.status,
+                                              (self.duration or 0) * 1000, phases)
+
+class Tracer():
+    """Sends the :class:`Span` of every request to sinks. It can be given to
+    :class:`Intra` and :class:`AsyncIntra`.
+
+    Parameters
+    ----------
+    *sinks : callable
+        Called with each ended :class:`Span`. An exception raised by a sink
+        is ignored so tracing never breaks a request.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink):
+        """Add a sink."""
+        self.sinks.append(sink)
+
+    def start(self, endpoint, method, url):
+        """Returns a new :class:`Span`."""
+        return Span(endpoint, method, url)
+
+    def emit(self, span):
+        """End a span and send it to the sinks."""
+
+        if span.duration is None:
+            span.end()
+        for sink in self.sinks:
+            try:
+                sink(span)
+            except Exception:
+                pass
+
+class SlowRequestLog():
+    """A sink keeping the last slow requests in a ring buffer.
+
+    Parameters
+    ----------
+    threshold : float
+        The duration in seconds from which a request is slow.
+    maxlen : int
+        The number of spans kept.
+    """
+
+    def __init__(self, threshold=1.0, maxlen=100):
+        self.threshold = threshold
+        self._spans = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        if span.duration is not None and span.duration >= self.threshold:
+            with self._lock:
+                self._spans.append(span)
+
+    def __len__(self):
+        return len(self._spans)
+
+    def entries(self):
+        """Returns the kept spans, the most recent last."""
+
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        """Forget the kept spans."""
+
+        with self._lock:
+            self._spans.clear()
@@ -26,12 +26,14 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
-from datetime import datetime
+from .utils import parse_datetime, lazy_field, relation, model_getstate, model_setstate
 
 class Trophy():
     """Represents an trophy on the intranet. This class parse
     and give formatted information about an trophy.
 
+    The date is parsed on first access.
+
     Attributes
     -----------
     id: int
@@ -42,16 +44,29 @@ class Trophy():
         The description of the trophy.
     type: str
         The type of the trophy.
-    image_url: str
-        The URL of the trophy's image.
     achieved_at: :class:`datetime.datetime`
         The date of presentation of the trophy.
+    picture: bytes
+        The content of the image of the trophy, fetched on first access.
     """
 
-    def __init__(self, json_data):
+    __slots__ = ('_raw', 'id', 'name', 'description', 'type', '_achieved_at', '_client', '_picture')
+
+    achieved_at = lazy_field('achieved_at', parse_datetime, 0)
+    picture = relation('trophy_picture', 'id')
+
+    __getstate__ = model_getstate
+    __setstate__ = model_setstate
+
+    def __init__(self, json_data, client=None):
+        self._raw = json_data
+        self._client = client
         self.id = json_data["id"]
         self.name = json_data["name"]
         self.description = json_data["description"]
         self.type = json_data["type"]
-        self.image_url = 'https://achievements.etna-alternance.net/api/achievements/%d.png' % (self.id)
-        self.achieved_at = datetime.strptime(json_data["achieved_at"][0], '%Y-%m-%d %H:%M:%S')
+
+    @property
+    def image_url(self):
+        """A property that returns the URL of the trophy's image."""
+        return 'https://achievements.etna-alternance.net/api/achievements/%d.png' % (self.id,)
@@ -26,12 +26,22 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
-from datetime import datetime
+from .utils import parse_datetime, lazy_field, relation, model_getstate, model_setstate
+
+def _parse_close(value):
+    # The field is ``false`` while the account is open.
+    if isinstance(value, bool):
+        return None
+    return parse_datetime(value)
 
 class User():
     """Represents an user on the intranet. This class parse
     and give formatted information about an user.
 
+    The dates are parsed on first access. The trophies and promotions are
+    fetched on first access through the client which built the user, see
+    :class:`etnapy.utils.relation`.
+
     Attributes
     -----------
     id: int
@@ -50,32 +60,41 @@ class User():
         The date of closure of the account if it took place.
     roles: list of str
         The roles of the user.
-    created_at: :class:`datetime.datetime`
+    created_at: Optional[`datetime.datetime`]
         The date of creation of the account.
-    updated_at: :class:`datetime.datetime`
+    updated_at: Optional[`datetime.datetime`]
         The date of the last update of the account.
     deleted_at: Optional[`datetime.datetime`]
         The date of deletion of the account if the account has been deleted.
+    trophies: list of :class:`Trophy`
+        The trophies of the user, fetched on first access.
+    promos: list of :class:`Promo`
+        The promotions of the user, fetched on first access.
     """
 
-    def __init__(self, json_data):
+    __slots__ = ('_raw', 'id', 'login', 'firstname', 'lastname', 'email', 'close', 'roles',
+                 '_closed_at', '_created_at', '_updated_at', '_deleted_at', '_client', '_trophies', '_promos')
+
+    closed_at = lazy_field('close', _parse_close)
+    created_at = lazy_field('created_at', parse_datetime)
+    updated_at = lazy_field('updated_at', parse_datetime)
+    deleted_at = lazy_field('deleted_at', parse_datetime)
+    trophies = relation('user_trophy', 'login')
+    promos = relation('user_promo', 'login')
+
+    __getstate__ = model_getstate
+    __setstate__ = model_setstate
+
+    def __init__(self, json_data, client=None):
+        self._raw = json_data
+        self._client = client
         self.id = json_data["id"]
         self.login = json_data["login"]
         self.firstname = json_data["firstname"]
         self.lastname = json_data["lastname"]
         self.email = json_data["email"]
-        if isinstance(json_data["close"], (bool)):
-            self.close = False
-        else:
-            self.close = True
-            self.closed_at = datetime.strptime(json_data["close"], '%Y-%m-%d %H:%M:%S')
+        self.close = not isinstance(json_data["close"], (bool))
         self.roles = json_data["roles"]
-        if json_data["created_at"] is not None:
-            self.created_at = datetime.strptime(json_data["created_at"], '%Y-%m-%d %H:%M:%S')
-        if json_data["updated_at"] is not None:
-            self.updated_at = datetime.strptime(json_data["updated_at"], '%Y-%m-%d %H:%M:%S')
-        if json_data["deleted_at"] is not None:
-            self.deleted_at = datetime.strptime(json_data["deleted_at"], '%Y-%m-%d %H:%M:%S')
 
     @property
     def identity(self):
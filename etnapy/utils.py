@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+from datetime import datetime, date
+
+def parse_datetime(value):
+    """Parse a ``%Y-%m-%d %H:%M:%S`` string as sent by the intranet.
+
+    The fixed layout is sliced directly, which is many times faster than
+    :func:`datetime.datetime.strptime`. Any other layout falls back to
+    :func:`~datetime.datetime.strptime`.
+    """
+
+    if len(value) == 19 and value[4] == '-' and value[7] == '-' and value[10] == ' ':
+        return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                        int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+def parse_date(value):
+    """Parse a ``%Y-%m-%d`` string as sent by the intranet. See
+    :func:`parse_datetime`.
+    """
+
+    if len(value) == 10 and value[4] == '-' and value[7] == '-':
+        return date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+class lazy_field():
+    """A descriptor parsing a field of the raw json of a model on first
+    access. The raw json must be stored in the ``_raw`` slot of the model
+    and the parsed value is cached in a slot named after the attribute
+    with a leading underscore.
+
+    Parameters
+    ----------
+    key : str
+        The key of the field in the raw json.
+    parser : callable
+        Called with the raw value, except ``None`` which is kept as is.
+    index : Optional[int]
+        The index of the value if the raw field is a list.
+    """
+
+    __slots__ = ('key', 'parser', 'index', 'slot')
+
+    def __init__(self, key, parser, index=None):
+        self.key = key
+        self.parser = parser
+        self.index = index
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            pass
+
+        value = instance._raw.get(self.key)
+        if value is not None and self.index is not None:
+            value = value[self.index]
+        if value is not None:
+            value = self.parser(value)
+        setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+class relation():
+    """A descriptor loading an object related to a model through the
+    client which built the model, on first access. The client must be
+    stored in the ``_client`` slot of the model and the loaded value is
+    cached in a slot named after the attribute with a leading underscore.
+
+    With :class:`Intra` the value is returned directly. With
+    :class:`AsyncIntra` it is a future to await, and the relations accessed
+    during the same tick of the event loop are loaded in a single batch.
+    A model built without a client, or pickled or copied (see
+    :func:`model_getstate`), has its relations set to ``None``.
+
+    Parameters
+    ----------
+    loader : str
+        The name of the client method loading the value.
+    key : str
+        The attribute of the model given to the loader.
+    """
+
+    __slots__ = ('loader', 'key', 'slot')
+
+    def __init__(self, loader, key):
+        self.loader = loader
+        self.key = key
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            pass
+
+        client = instance._client
+        if client is None:
+            return None
+        value = client._load(self.loader, getattr(instance, self.key))
+        if value is not None:
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+def model_getstate(self):
+    """The ``__getstate__`` of the models: their slots without the client
+    nor the values of their :class:`relation`, which may hold locks,
+    sessions or futures. A model pickled or copied therefore has no
+    client, and its relations are ``None``.
+    """
+
+    cls = type(self)
+    skipped = {'_client'}
+    skipped.update(d.slot for d in vars(cls).values() if isinstance(d, relation))
+    return {name: getattr(self, name) for name in cls.__slots__
+            if name not in skipped and hasattr(self, name)}
+
+def model_setstate(self, state):
+    """The ``__setstate__`` of the models, see :func:`model_getstate`."""
+
+    self._client = None
+    for name, value in state.items():
+        setattr(self, name, value)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+from .utils import model_getstate, model_setstate
+
+async def _no_conversations():
+    return
+    yield
+
+class WallPageError(Exception):
+    """Raised while iterating over a wall when a page could not be
+    fetched, so that a failure is not mistaken for the end of the wall.
+
+    Attributes
+    -----------
+    wall: str
+        The name of the wall.
+    start: int
+        The offset of the page which failed.
+    """
+
+    def __init__(self, wall, start):
+        super().__init__('Could not fetch the conversations of the wall %r from %d' % (wall, start))
+        self.wall = wall
+        self.start = start
+
+def page_conversations(page):
+    """Returns the list of conversations of a page returned by
+    :func:`Intra.wall_messages`. The intranet wraps them in a ``hits``
+    field, a bare list is accepted as well.
+    """
+
+    if page is None:
+        return []
+    if isinstance(page, dict):
+        return page.get('hits') or []
+    return page
+
+def page_total(page):
+    """Returns the total number of conversations of the wall announced by a
+    page, or ``None`` if unknown.
+    """
+
+    if isinstance(page, dict):
+        return page.get('total')
+    return None
+
+class Wall():
+    """Represents a wall of the intranet, as reached from :attr:`Promo.wall`.
+    Nothing is fetched until the conversations are read, through the
+    client which built the promotion: with :class:`AsyncIntra` the methods
+    return coroutines and the wall is iterated with ``async for``.
+
+    Attributes
+    -----------
+    name: str
+        The name of the wall.
+    """
+
+    __slots__ = ('name', '_client')
+
+    __getstate__ = model_getstate
+    __setstate__ = model_setstate
+
+    def __init__(self, name, client=None):
+        self.name = name
+        self._client = client
+
+    def __repr__(self):
+        return '<Wall name=%r>' % (self.name,)
+
+    def messages(self, start=0, stop=20):
+        """Get a page of conversations, see :func:`Intra.wall_messages`."""
+
+        if self._client is None:
+            return None
+        return self._client.wall_messages(self.name, start, stop)
+
+    def __iter__(self):
+        if self._client is None:
+            return iter(())
+        return iter(self._client.iter_wall(self.name))
+
+    def __aiter__(self):
+        if self._client is None:
+            return _no_conversations()
+        return self._client.iter_wall(self.name).__aiter__()
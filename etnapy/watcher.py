@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+"""
+A python wrapper to help make python3 apps/bots using the ETNA API
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Yohann MARTIN
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import collections
+import heapq
+import json
+import random
+import threading
+import time
+
+from .ratelimit import TokenBucket
+from .wall import page_conversations, page_total
+
+class WallEvent():
+    """A conversation that appeared or changed on a wall.
+
+    Attributes
+    -----------
+    wall: str
+        The name of the wall.
+    kind: str
+        ``'new'`` for a conversation not seen before, ``'updated'`` for a
+        conversation whose content changed.
+    conversation: dict
+        The json object of the conversation.
+    seen_at: float
+        The timestamp at which the change was detected.
+    """
+
+    __slots__ = ('wall', 'kind', 'conversation', 'seen_at')
+
+    def __init__(self, wall, kind, conversation):
+        self.wall = wall
+        self.kind = kind
+        self.conversation = conversation
+        self.seen_at = time.time()
+
+    def __repr__(self):
+        return '<WallEvent wall=%r kind=%s id=%r>' % (self.wall, self.kind, self.conversation.get('id'))
+
+class _WallState():
+    __slots__ = ('name', 'interval', 'next_poll', 'seen', 'polls', 'changes', 'errors', 'last_change')
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.next_poll = time.monotonic()
+        self.seen = None
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self.last_change = None
+
+def _fingerprint(conversation):
+    return hash(json.dumps(conversation, sort_keys=True, default=str))
+
+class WallWatcher():
+    """Watches the walls of the intranet and reports their new and updated
+    conversations, polling each wall at its own pace.
+
+    Each poll fetches the first page of a wall and compares it with the
+    previous one. A wall with changes is polled twice as often, down to
+    ``min_interval``; a quiet wall is polled ``backoff`` times less often,
+    up to ``max_interval``. When a whole page is new, the next pages are
+    fetched until a known conversation is found. All the requests, the
+    periodic :func:`Intra.walls_list` included, draw from a single
+    :class:`TokenBucket` of ``budget`` requests per second.
+
+    The events are sent to the callbacks added with :func:`add_callback`,
+    and can be consumed with ``async for event in watcher``. The first poll
+    of a wall only records its state, it emits no event.
+
+    Parameters
+    ----------
+    intra : :class:`Intra`
+        A logged client.
+    walls : Optional[list of str]
+        The walls to watch. Defaults to every wall of :func:`Intra.walls_list`,
+        refreshed every ``walls_refresh`` seconds.
+    budget : float
+        The number of requests allowed per second, all walls together.
+    min_interval : float
+        The shortest delay between two polls of a wall, in seconds.
+    max_interval : float
+        The longest delay between two polls of a wall, in seconds.
+    backoff : float
+        The factor applied to the delay of a wall after a quiet poll.
+    page_size : int
+        The number of conversations fetched per request.
+    max_pages : int
+        The maximum number of pages fetched by a poll.
+    memory : int
+        The number of conversations remembered per wall.
+    walls_refresh : float
+        The delay between two refreshes of the list of the walls, in
+        seconds.
+
+    Attributes
+    -----------
+    bucket: :class:`TokenBucket`
+        The request budget.
+    requests: int
+        The number of requests sent.
+    errors: int
+        The number of failed refreshes of the list of the walls. The
+        failed polls are counted per wall, see :func:`stats`.
+    """
+
+    def __init__(self, intra, walls=None, budget=1.0, min_interval=15.0, max_interval=900.0, backoff=1.5,
+                 page_size=20, max_pages=5, memory=1000, walls_refresh=3600.0):
+        self.intra = intra
+        self.bucket = TokenBucket(budget, max(1.0, budget))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.memory = memory
+        self.walls_refresh = walls_refresh
+        self.callbacks = []
+        self.requests = 0
+        self.errors = 0
+        self._fixed_walls = walls is not None
+        self._walls = {}
+        self._schedule = []
+        self._walls_due = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for name in walls or ():
+            self._add_wall(name)
+
+    def add_callback(self, callback):
+        """Add a function called with each :class:`WallEvent`. An exception
+        raised by a callback is ignored. Returns the callback, so this can
+        be used as a decorator.
+        """
+
+        self.callbacks.append(callback)
+        return callback
+
+    def remove_callback(self, callback):
+        """Remove a function added with :func:`add_callback`."""
+
+        try:
+            self.callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def _add_wall(self, name):
+        if name in self._walls:
+            return
+        state = _WallState(name, self.min_interval)
+        self._walls[name] = state
+        heapq.heappush(self._schedule, (state.next_poll, name))
+
+    def _request(self, func, *args):
+        self.bucket.acquire()
+        self.requests += 1
+        return func(*args)
+
+    def _refresh_walls(self):
+        try:
+            walls = self._request(self.intra.walls_list)
+        except Exception:
+            walls = None
+        if walls is None:
+            # Retry soon, the walls already known are still polled.
+            self.errors += 1
+            self._walls_due = time.monotonic() + self.min_interval
+            return
+        self._walls_due = time.monotonic() + self.walls_refresh
+        names = set(walls)
+        for name in walls:
+            self._add_wall(name)
+        for name in list(self._walls):
+            if name not in names:
+                del self._walls[name]
+
+    def _diff(self, state, conversations):
+        """Returns the events of the conversations against the state of the
+        wall, which is updated.
+        """
+
+        events = []
+        seen = state.seen
+        first = seen is None
+        if first:
+            seen = state.seen = collections.OrderedDict()
+        for conversation in reversed(conversations):
+            key = conversation.get('id')
+            fingerprint = _fingerprint(conversation)
+            previous = seen.pop(key, None)
+            seen[key] = fingerprint
+            if first or previous == fingerprint:
+                continue
+            events.append(WallEvent(state.name, 'new' if previous is None else 'updated', conversation))
+        while len(seen) > self.memory:
+            seen.popitem(last=False)
+        events.reverse()
+        return events
+
+    def _fetch(self, state):
+        """Returns the conversations of the first pages of a wall, stopping
+        at the first page holding a known conversation. ``None`` on error:
+        the conversations of the pages before a failed one are not
+        returned, they would be marked as seen and the new conversations
+        of the failed page would never be sent.
+        """
+
+        conversations = []
+        for number in range(self.max_pages):
+            start = number * self.page_size
+            page = self._request(self.intra.wall_messages, state.name, start, self.page_size)
+            if page is None:
+                return None
+            hits = page_conversations(page)
+            conversations.extend(hits)
+            total = page_total(page)
+            if (state.seen is None or len(hits) < self.page_size
+                    or (total is not None and start + len(hits) >= total)
+                    or any(c.get('id') in state.seen for c in hits)):
+                break
+        return conversations
+
+    def poll(self, name):
+        """Poll a wall now and reschedule it. Returns the list of its
+        :class:`WallEvent`, which are also sent to the callbacks.
+        """
+
+        state = self._walls[name]
+        try:
+            conversations = self._fetch(state)
+        except Exception:
+            # A network error is a failed poll, the wall is polled again
+            # later instead of ending the loop of the watcher.
+            conversations = None
+        state.polls += 1
+        if conversations is None:
+            state.errors += 1
+            events = []
+            state.interval = min(self.max_interval, state.interval * 2)
+        else:
+            events = self._diff(state, conversations)
+            if events:
+                state.changes += len(events)
+                state.last_change = time.time()
+                state.interval = max(self.min_interval, state.interval / 2)
+            else:
+                state.interval = min(self.max_interval, state.interval * self.backoff)
+        # Jitter keeps the walls from being polled in lockstep.
+        state.next_poll = time.monotonic() + state.interval * random.uniform(0.9, 1.1)
+        with self._lock:
+            heapq.heappush(self._schedule, (state.next_poll, name))
+
+        for event in events:
+            for callback in list(self.callbacks):
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+        return events
+
+    def poll_due(self):
+        """Poll every wall whose time has come. Returns the list of the
+        :class:`WallEvent` found, and the number of seconds until the next
+        poll is due.
+        """
+
+        if not self._fixed_walls and (self._walls_due is None or time.monotonic() >= self._walls_due):
+            self._refresh_walls()
+
+        # Only the walls due now: under a tight budget, polling takes long
+        # enough for the first walls to be due again.
+        now = time.monotonic()
+        events = []
+        while True:
+            with self._lock:
+                if not self._schedule:
+                    return events, self.min_interval
+                next_poll, name = self._schedule[0]
+                state = self._walls.get(name)
+                if state is None or state.next_poll != next_poll:
+                    # A wall removed, or rescheduled since this entry.
+                    heapq.heappop(self._schedule)
+                    continue
+                if next_poll > now:
+                    return events, max(0.0, next_poll - time.monotonic())
+                heapq.heappop(self._schedule)
+            events.extend(self.poll(name))
+
+    def run(self):
+        """Poll the walls until :func:`stop` is called."""
+
+        self._stop.clear()
+        while not self._stop.is_set():
+            _, delay = self.poll_due()
+            self._stop.wait(delay)
+
+    def start(self):
+        """Run the watcher in a background thread, if not already running."""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='WallWatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the watcher and wait for its thread to end."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    async def events(self):
+        """Iterate over the :class:`WallEvent` as they are found. The
+        watcher is started in a background thread if not already running.
+        """
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+
+        def deliver(event):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        self.add_callback(deliver)
+        self.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.remove_callback(deliver)
+
+    def __aiter__(self):
+        return self.events()
+
+    def stats(self):
+        """Returns a dict mapping each wall to its current polling
+        interval, number of polls, changes seen and errors.
+        """
+
+        return {
+            name: {
+                'interval': state.interval,
+                'polls': state.polls,
+                'changes': state.changes,
+                'errors': state.errors,
+                'last_change': state.last_change,
+            } for name, state in list(self._walls.items())
+        }
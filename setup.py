@@ -20,5 +20,15 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
+    python_requires=">=3.7",
     install_requires=["requests"],
+    entry_points={
+        "console_scripts": ["etnapy=etnapy.cli:main"],
+    },
+    extras_require={
+        "async": ["aiohttp"],
+        "numpy": ["numpy"],
+        "orjson": ["orjson"],
+        "parquet": ["pyarrow"],
+    },
 )